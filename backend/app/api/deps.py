@@ -1,8 +1,10 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.config import settings
+from app.database import SessionLocal, AsyncSessionLocal
 from app.utils.auth import decode_token
 from app.models.user import User
 
@@ -14,6 +16,11 @@ def get_db() -> Generator:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 auth_scheme = HTTPBearer(auto_error=False)
 
 
@@ -34,3 +41,10 @@ def get_current_user(
         return user
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+
+def get_operator_user(current_user: User = Depends(get_current_user)) -> User:
+    """Current user, if listed in OPERATOR_EMAILS; guards views of process-wide state across all tenants"""
+    if (current_user.email or "").lower() not in settings.OPERATOR_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operator access required")
+    return current_user
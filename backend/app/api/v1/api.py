@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from app.api.v1.endpoints import agents, tools, api_keys, custom_gpts, chat, auth
-from app.api.v1.endpoints import whatsapp
+from app.api.v1.endpoints import whatsapp, metrics, usage
 
 api_router = APIRouter()
 
@@ -11,3 +11,5 @@ api_router.include_router(custom_gpts.router, prefix="/custom-gpts", tags=["cust
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"]) 
 api_router.include_router(whatsapp.router, prefix="/integrations", tags=["integrations-whatsapp"]) 
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(usage.router, prefix="/usage", tags=["usage"])
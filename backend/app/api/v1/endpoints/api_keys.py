@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from app.api.deps import get_db, get_current_user
 from app.crud import api_key_crud
 from app.schemas.api_key import ApiKey, ApiKeyCreate, ApiKeyUpdate
+from app.utils.llm_clients import llm_client_registry
 import uuid
 
 router = APIRouter()
@@ -63,6 +64,7 @@ def update_api_key(
         raise HTTPException(status_code=404, detail="API key not found")
     
     api_key = api_key_crud.update(db, db_obj=api_key, obj_in=api_key_in)
+    llm_client_registry.invalidate(api_key_id)
     return api_key
 
 @router.delete("/{api_key_id}", response_model=ApiKey)
@@ -78,4 +80,5 @@ def delete_api_key(
         raise HTTPException(status_code=404, detail="API key not found")
     
     api_key = api_key_crud.remove(db, id=api_key_id)
+    llm_client_registry.invalidate(api_key_id)
     return api_key
@@ -1,194 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from openai import OpenAI
 import json
+from typing import Any, AsyncIterator, Dict, Optional
 
-from app.api.deps import get_db, get_current_user
-from app.crud import agent_crud, message_crud, api_key_crud
-from app.schemas.message import ChatRequest, ChatResponse, MessageCreate
-from app.utils.tool_utils import call_external_tool
-
-router = APIRouter()
-
-# Define a maximum number of retries for tool execution
-MAX_RETRIES = 3
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-# Initialize retry count dictionary
-retry_count = {}
+from app.api.deps import get_db, get_async_db, get_current_user
+from app.crud import agent_crud, message_crud
+from app.schemas.message import ChatRequest
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.utils.chat_engine import prepare_chat_turn, run_chat_turn, stream_chat_turn
+from app.utils.request_coalescer import IdempotencyConflict, chat_coalescer, request_fingerprint
 
-# Initialize tool_calls as an empty list
-validated_tools = []
-tool_calls = []
+router = APIRouter()
 
 #  response_model=ChatResponse
 @router.post("/",)
-def chat_with_agent(
+async def chat_with_agent(
     *,
-    db: Session = Depends(get_db),
     chat_request: ChatRequest,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    """Chat with an agent"""
-    # Get agent details
-    agent = agent_crud.get(db, id=chat_request.agent_id, user_id=current_user.id)
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    # Get API key for the agent
-    api_key = None
-    if agent.apiKeyId:
-        api_key_obj = api_key_crud.get(db, id=agent.apiKeyId)
-        if api_key_obj:
-            api_key = api_key_obj.key
-    
-    if not api_key:
-        raise HTTPException(status_code=400, detail="No API key configured for this agent")
-    
-    # Initialize OpenAI client
-    client = OpenAI(api_key=api_key)
-    
-    # Get chat history
-    messages_history = message_crud.get_chat_history(
-        db, 
-        agent_id=chat_request.agent_id, 
-        user_id=current_user.id
+    """
+    Chat with an agent.
+
+    An identical request (same agent, user, conversation and message) arriving while one is
+    running, or shortly after it finished, gets the same response instead of
+    a second turn. With an `Idempotency-Key` header the response is replayed
+    for that key for longer, whatever the timing.
+    """
+    fingerprint = request_fingerprint(
+        chat_request.agent_id, current_user.id, chat_request.conversation_id or "", chat_request.message_content
     )
-    
-    # Add system message with agent instructions at the beginning
-    if agent.roleInstructions:
-        system_message = {
-            "role": "system",
-            "content": agent.roleInstructions
-        }
-        messages_history.insert(0, system_message)
-    
+    if idempotency_key:
+        key = request_fingerprint("idempotency", current_user.id, idempotency_key)
+        ttl = settings.CHAT_IDEMPOTENCY_TTL
+    else:
+        key = fingerprint
+        ttl = settings.CHAT_COALESCE_WINDOW
 
-    user_message = {
-        "role": "user",
-        "content": chat_request.message_content
-    }
-    messages_history.append(user_message)
-
-    # Save user message to database
-    user_message_create = MessageCreate(
+    try:
+        return await chat_coalescer.run(key, fingerprint, ttl, lambda: _run_chat_turn_in_own_session(
+            agent_id=chat_request.agent_id,
+            user_id=current_user.id,
+            message_content=chat_request.message_content,
+            conversation_id=chat_request.conversation_id
+        ))
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+async def _run_chat_turn_in_own_session(**kwargs: Any) -> Any:
+    """Run a turn on a fresh session; coalesced requests share the task, so it must not borrow one request's session"""
+    async with AsyncSessionLocal() as db:
+        return await run_chat_turn(db, **kwargs)
+
+async def _sse_events(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Encode engine events as Server-Sent Events"""
+    async for event in events:
+        yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@router.post("/stream")
+async def stream_chat_with_agent(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    chat_request: ChatRequest,
+    current_user = Depends(get_current_user)
+):
+    """Chat with an agent, streaming tokens and tool progress as Server-Sent Events"""
+    turn = await prepare_chat_turn(
+        db,
         agent_id=chat_request.agent_id,
         user_id=current_user.id,
-        role="user",
-        content=chat_request.message_content
+        message_content=chat_request.message_content,
+        conversation_id=chat_request.conversation_id
+    )
+    return StreamingResponse(
+        _sse_events(stream_chat_turn(turn)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    message_crud.create(db, obj_in=user_message_create)
-    
-    # Get tools for the agent
-    tools = []
-    tool_base_urls = {}  # Map tool names to their base URLs
-    tool_secret_codes = {}  # Map tool names to their secret codes
-    if agent.tools:
-        for tool in agent.tools:
-            try:
-                # Parse schema from openapiSchema or functionSchema
-                parsed_schema = None
-                parsed_schema = tool.functionSchema
-                if isinstance(parsed_schema, dict) and "tools" in parsed_schema:
-                    for schema_tool in parsed_schema["tools"]:
-                        tools.append(schema_tool)
-                        if schema_tool.get("type") == "function":
-                            tool_name = schema_tool["function"]["name"]
-                            tool_base_urls[tool_name] = tool.baseUrl
-                            tool_secret_codes[tool_name] = getattr(tool, "secretCode", None)
-                elif isinstance(parsed_schema, list):
-                    for schema_tool in parsed_schema:
-                        tools.append(schema_tool)
-                        if schema_tool.get("type") == "function":
-                            tool_name = schema_tool["function"]["name"]
-                            tool_base_urls[tool_name] = tool.baseUrl
-                            tool_secret_codes[tool_name] = getattr(tool, "secretCode", None)
-                elif isinstance(parsed_schema, dict) and parsed_schema.get("type") == "function":
-                    tools.append(parsed_schema)
-                    tool_name = parsed_schema["function"]["name"]
-                    tool_base_urls[tool_name] = tool.baseUrl
-                    tool_secret_codes[tool_name] = getattr(tool, "secretCode", None)
-            except (json.JSONDecodeError, KeyError):
-                continue
-
-    try:
-        while True:
-            # Call OpenAI API
-            response = client.chat.completions.create(
-                model=agent.model,
-                messages=messages_history,
-                tools=tools if tools else None,
-                temperature=agent.temperature
-            )
-
-            msg = response.choices[0].message
-
-            # Handle tool calls
-            if msg.tool_calls:
-                for tool_call in msg.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments or "{}")
-                    tool_id = tool_call.id
-
-                    print(f"Tool call ({tool_id}): {tool_name}({tool_args})")
-
-                    retry_count.setdefault(tool_id, 0)
-
-                    try:
-                        # Get base URL for this tool
-                        base_url = tool_base_urls.get(tool_name)
-                        if not base_url:
-                            raise Exception(f"No base URL configured for tool: {tool_name}")
-                        
-                        # Call external tool service with Authorization header if secretCode is present
-                        secret_code = tool_secret_codes.get(tool_name)
-                        result = call_external_tool(base_url, tool_name, tool_args, secret_code)
-
-                        messages_history.append(msg)
-                        messages_history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_id,
-                            "content": json.dumps(result)
-                        })
-
-                    except Exception as e:
-                        retry_count[tool_id] += 1
-
-                        if retry_count[tool_id] >= MAX_RETRIES:
-                            # After 3 retries, inform the user
-                            raise HTTPException(status_code=500, detail=f"⚠️ I tried 3 times to run `{tool_name}` but it kept failing. Last error: {str(e)}")
-
-                        # Send error back so model can retry with corrected args
-                        messages_history.append(msg)
-                        messages_history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_id,
-                            "content": json.dumps({"error": str(e)})
-                        })
-
-            else:
-                # Natural language final response
-                content = msg.content or ""
-                assistant_message_create = MessageCreate(
-                    agent_id=chat_request.agent_id,
-                    user_id=current_user.id,
-                    role="assistant",
-                    content=content,
-                    tool_calls=[tool_call.model_dump() for tool_call in tool_calls] if tool_calls else None
-                )
-                assistant_message_db = message_crud.create(db, obj_in=assistant_message_create)
-                
-                return ChatResponse(
-                    message_id=assistant_message_db.id,
-                    content=content,
-                    role="assistant",
-                    tool_calls=[tool_call.model_dump() for tool_call in tool_calls] if tool_calls else None,
-                    created_at=assistant_message_db.created_at
-                )
-        
-    except Exception as e:
-        import traceback
-        print(traceback.print_exc())
-        raise HTTPException(status_code=500, detail=f"Error calling OpenAI API: {str(e)}")
 
 @router.get("/history/{agent_id}/{user_id}")
 def get_chat_history(
@@ -197,9 +90,11 @@ def get_chat_history(
     agent_id: str,
     user_id: str,
     current_user = Depends(get_current_user),
-    limit: int = 50
+    conversation_id: Optional[str] = None,
+    limit: int = 50,
+    include_tool_messages: bool = False
 ):
-    """Get chat history for a specific agent and user"""
+    """Get chat history for a specific agent and user, from the default thread or `conversation_id`"""
     
     # Verify agent exists
     agent = agent_crud.get(db, id=agent_id, user_id=current_user.id)
@@ -213,8 +108,10 @@ def get_chat_history(
     messages = message_crud.get_by_agent_and_user(
         db, 
         agent_id=agent_id, 
-        user_id=user_id, 
-        limit=limit
+        user_id=user_id,
+        conversation_id=conversation_id,
+        limit=limit,
+        visible_only=not include_tool_messages
     )
     
     return [
@@ -228,3 +125,19 @@ def get_chat_history(
         }
         for msg in messages
     ]
+
+@router.get("/conversations/{agent_id}/{user_id}")
+def get_conversations(
+    *,
+    db: Session = Depends(get_db),
+    agent_id: str,
+    user_id: str,
+    current_user = Depends(get_current_user)
+):
+    """List the conversation threads of an agent and user; `conversation_id` null is the default thread"""
+    agent = agent_crud.get(db, id=agent_id, user_id=current_user.id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if user_id == "me":
+        user_id = current_user.id
+    return message_crud.get_conversations(db, agent_id=agent_id, user_id=user_id)
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends
+from app.api.deps import get_operator_user
+from app.utils.circuit_breaker import tool_breakers
+from app.utils.integration_cache import whatsapp_integration_cache
+from app.utils.message_debouncer import whatsapp_debouncer
+from app.utils.message_ledger import whatsapp_message_ledger
+from app.utils.key_balancer import key_balancer
+from app.utils.llm_clients import llm_client_registry
+from app.utils.rate_limiter import llm_rate_limiter
+from app.utils.request_coalescer import chat_coalescer
+from app.utils.tool_cache import tool_result_cache
+from app.utils.tool_http import tool_http_pool
+from app.utils.tool_manifest import agent_manifest_cache
+from app.utils.outbound_messages import whatsapp_outbound
+from app.utils.twilio_messages import twilio_messages
+from app.utils.worker_pool import whatsapp_worker_pool
+
+router = APIRouter()
+
+@router.get("/llm-clients")
+def read_llm_client_metrics(current_user = Depends(get_operator_user)):
+    """Get hit/miss and eviction stats for the pooled LLM clients"""
+    return llm_client_registry.stats()
+
+@router.get("/agent-manifests")
+def read_agent_manifest_metrics(current_user = Depends(get_operator_user)):
+    """Get hit/miss stats for the compiled agent tool manifests"""
+    return agent_manifest_cache.stats()
+
+@router.get("/tool-cache")
+def read_tool_cache_metrics(current_user = Depends(get_operator_user)):
+    """Get hit-rate and eviction stats for cached tool results"""
+    return tool_result_cache.stats()
+
+@router.get("/tool-breakers")
+def read_tool_breaker_metrics(current_user = Depends(get_operator_user)):
+    """Get circuit breaker state for tool endpoints that have failed"""
+    return tool_breakers.stats()
+
+@router.get("/rate-limits")
+def read_rate_limit_metrics(current_user = Depends(get_operator_user)):
+    """Get queue depth, wait times and rejections per API key"""
+    return llm_rate_limiter.stats()
+
+@router.get("/chat-coalescing")
+def read_chat_coalescing_metrics(current_user = Depends(get_operator_user)):
+    """Get how many chat requests were served by an identical in-flight or recent turn"""
+    return chat_coalescer.stats()
+
+@router.get("/api-keys")
+def read_api_key_health_metrics(current_user = Depends(get_operator_user)):
+    """Get latency, error rate and hedging stats per API key"""
+    return key_balancer.stats()
+
+@router.get("/tool-http")
+def read_tool_http_metrics(current_user = Depends(get_operator_user)):
+    """Get pooled HTTP client stats per tool service origin"""
+    return tool_http_pool.stats()
+
+@router.get("/whatsapp")
+def read_whatsapp_metrics(current_user = Depends(get_operator_user)):
+    """Get the WhatsApp worker queue, webhook integration cache, debounce, MessageSid receipt, per-number outbound queue and Twilio message stats"""
+    return {
+        "workers": whatsapp_worker_pool.stats(),
+        "integration_cache": whatsapp_integration_cache.stats(),
+        "debounce": whatsapp_debouncer.stats(),
+        "receipts": whatsapp_message_ledger.stats(),
+        "outbound": whatsapp_outbound.stats(),
+        "twilio": twilio_messages.stats(),
+    }
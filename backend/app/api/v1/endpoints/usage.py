@@ -0,0 +1,31 @@
+from datetime import date
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.api.deps import get_db, get_current_user
+from app.crud import usage_crud
+from app.schemas.usage import UsageStatsResponse
+
+router = APIRouter()
+
+@router.get("/stats", response_model=UsageStatsResponse)
+def read_usage_stats(
+    *,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user),
+    agent_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: Optional[Literal["day", "agent", "user"]] = None
+):
+    """Get token totals and latency percentiles for your agents, optionally grouped"""
+    return usage_crud.get_stats(
+        db,
+        owner_id=current_user.id,
+        agent_id=agent_id,
+        user_id=user_id,
+        start=start,
+        end=end,
+        group_by=group_by
+    )
@@ -4,22 +4,33 @@ import hmac
 import os
 from typing import Any, Dict, List
 from fastapi import APIRouter, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_db, get_async_db, get_current_user
+from app.crud.whatsapp_dead_letter import wa_dead_letter_crud
 from app.crud.whatsapp_integration import wa_integration_crud
 from app.schemas.whatsapp_integration import (
     WhatsAppIntegration as WhatsAppIntegrationSchema,
-    WhatsAppIntegrationCreate
+    WhatsAppIntegrationCreate,
+    WhatsAppIntegrationUpdate,
+    WhatsAppDeadLetter as WhatsAppDeadLetterSchema,
 )
-from app.api.v1.endpoints.chat import chat_with_agent
-from app.schemas.message import ChatRequest
-from app.database import SessionLocal
+from app.database import AsyncSessionLocal
 from app.models.user import User
+from app.utils.chat_engine import run_chat_turn
+from app.utils.integration_cache import IntegrationRoute, whatsapp_integration_cache
+from app.utils.message_debouncer import whatsapp_debouncer
+from app.utils.message_ledger import whatsapp_message_ledger
+from app.utils.outbound_messages import whatsapp_outbound
+from app.utils.worker_pool import whatsapp_worker_pool
 
 
 router = APIRouter()
 
+# Acknowledges a webhook without replying inline; replies go out through the Messages API
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
 
 def _secure_compare(a: str, b: str) -> bool:
     try:
@@ -40,60 +51,60 @@ def _verify_twilio_signature(full_url: str, params: Dict[str, Any], header_signa
     return _secure_compare(computed, header_signature)
 
 
-def _call_chat_and_build_messages(text: str, agent_id: str, user_id: str) -> List[Dict[str, Any]]:
+async def _call_chat_and_build_messages(
+    text: str,
+    agent_id: str,
+    user_id: str,
+    conversation_id: str | None = None,
+) -> List[Dict[str, Any]]:
     """
-    Call the chat endpoint to generate a response using the specified agent and user.
+    Run a chat turn to generate a response using the specified agent and user.
     
     Args:
         text: The message text to process
         agent_id: The agent ID to use for chat
         user_id: The user ID for the chat session
+        conversation_id: The thread to read and write, e.g. one per WhatsApp sender
         
     Returns:
         List of message dictionaries
     """
     if not agent_id or not user_id:
         return []
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await db.get(User, user_id)
+            if not user:
+                return []
+            # Not through chat_with_agent: its content-fingerprint coalescing would hand a
+            # repeated message the earlier reply without storing it; webhook retries are
+            # deduplicated by MessageSid instead
+            resp = await run_chat_turn(
+                db, agent_id=agent_id, user_id=user.id, message_content=text or "", conversation_id=conversation_id
+            )
+            content = getattr(resp, "content", None)
+            if content:
+                return [{"type": "text", "text": content}]
+            return []
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            print("Exception", e)
             return []
-        chat_req = ChatRequest(agent_id=agent_id, user_id=user_id, message_content=text or "")
-        resp = chat_with_agent(db=db, chat_request=chat_req, current_user=user)
-        content = getattr(resp, "content", None)
-        if content:
-            return [{"type": "text", "text": content}]
-        return []
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print("Exception", e)
-        return []
-    finally:
-        db.close()
 
-def _get_agent_and_user_by_path_token(db: Session, path_token: str) -> Dict[str, str] | None:
-    """
-    Get agent_id and user_id from WhatsApp integration by path_token.
-    
-    Args:
-        db: Database session
-        path_token: The unique path token for the WhatsApp integration
-        
-    Returns:
-        Dict with agent_id and user_id if found, None otherwise
-    """
-    integration = wa_integration_crud.get_by_path_token(db, path_token=path_token)
-    if integration and integration.enabled:
-        return {
-            "agent_id": integration.agent_id,
-            "user_id": integration.user_id
-        }
-    return None
+async def _resolve_integration(db: AsyncSession, path_token: str) -> IntegrationRoute | None:
+    """Look up the integration behind a webhook URL, from the cache when possible"""
+    hit, route = whatsapp_integration_cache.get(path_token)
+    if hit:
+        return route
+    generation = whatsapp_integration_cache.generation
+    integration = await wa_integration_crud.aget_by_path_token(db, path_token=path_token)
+    route = IntegrationRoute.from_model(integration) if integration else None
+    whatsapp_integration_cache.put(path_token, route, generation)
+    return route
 
 
-def _process_and_respond(normalized: Dict[str, Any], agent_id: str, user_id: str) -> str:
+async def _process_and_respond(normalized: Dict[str, Any], agent_id: str, user_id: str) -> str:
     """
     Process the normalized message and generate a response using the specified agent.
     
@@ -105,8 +116,10 @@ def _process_and_respond(normalized: Dict[str, Any], agent_id: str, user_id: str
     Returns:
         The response text from the agent
     """
-    # Use internal chat endpoint to produce assistant reply
-    messages = _call_chat_and_build_messages(normalized.get("text"), agent_id, user_id)
+    # Use internal chat endpoint to produce assistant reply, in the sender's own thread
+    messages = await _call_chat_and_build_messages(
+        normalized.get("text"), agent_id, user_id, normalized.get("conversation_id")
+    )
     if isinstance(messages, list):
         for m in messages:
             if isinstance(m, dict) and m.get("type") == "text" and m.get("text"):
@@ -115,20 +128,71 @@ def _process_and_respond(normalized: Dict[str, Any], agent_id: str, user_id: str
     
 
 
+def _merge_messages(batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine messages a sender fired off in a row into one, texts in arrival order"""
+    if len(batch) == 1:
+        return batch[0]
+    merged = dict(batch[-1])
+    merged["text"] = "\n".join(m["text"] for m in batch if m.get("text"))
+    merged["raw"] = [m.get("raw") for m in batch]
+    merged["metadata"] = {**(batch[-1].get("metadata") or {}), "merged_messages": len(batch)}
+    return merged
+
+
+async def _process_and_reply(batch: List[Dict[str, Any]], agent_id: str, user_id: str, reply_to: Dict[str, str]) -> None:
+    """
+    Run one chat turn for a sender's buffered messages and queue the reply for Twilio.
+
+    Runs on the WhatsApp worker pool, after the webhook has been acknowledged
+    and the debounce window has closed.
+    """
+    message_sids = [m.get("message_sid") for m in batch]
+    reply_text, handed_off = None, False
+    try:
+        reply_text = await _process_and_respond(_merge_messages(batch), agent_id, user_id)
+        if not reply_to["account_sid"] or not reply_to["auth_token"] or not reply_to["from_number"]:
+            print(f"Cannot reply to {reply_to['to_number']}: integration has no Twilio account SID, auth token or number")
+            return
+
+        async def record_outcome(sent: bool) -> None:
+            await whatsapp_message_ledger.finish(message_sids, "replied" if sent else "failed", reply_text)
+
+        # Paced per sending number; the outcome is recorded once the reply is delivered or dead-lettered
+        await whatsapp_outbound.enqueue(
+            account_sid=reply_to["account_sid"],
+            auth_token=reply_to["auth_token"],
+            from_number=reply_to["from_number"],
+            to_number=reply_to["to_number"],
+            text=reply_text,
+            integration_id=reply_to["integration_id"],
+            on_done=record_outcome,
+        )
+        handed_off = True
+    finally:
+        if not handed_off:
+            await whatsapp_message_ledger.finish(message_sids, "failed", reply_text)
+
+
 @router.post("/connectors/whatsapp/twilio/{path_token}")
-async def twilio_webhook(path_token: str, request: Request, db: Session = Depends(get_db)):
+async def twilio_webhook(path_token: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Receive an inbound WhatsApp message from Twilio.
+
+    Verifies the request, buffers the message and acknowledges with empty
+    TwiML straight away, well inside Twilio's webhook timeout. Messages a
+    sender sends within WHATSAPP_DEBOUNCE_WINDOW of each other are answered
+    as one agent turn on a background worker, which queues the reply for
+    the paced outbound sender of the integration's number. Retries of a MessageSid that was
+    already accepted are acknowledged without another agent turn.
+    """
     # Twilio sends application/x-www-form-urlencoded
     form = await request.form()
     params = {k: v for k, v in form.items()}
     header_sig = request.headers.get("X-Twilio-Signature")
-    
-    # Get agent_id and user_id from path_token
-    agent_user_info = _get_agent_and_user_by_path_token(db, path_token)
-    if not agent_user_info:
+
+    integration = await _resolve_integration(db, path_token)
+    if not integration or not integration.enabled:
         raise HTTPException(status_code=404, detail="integration not found")
-    
-    # Get the full integration object for Twilio settings
-    integration = wa_integration_crud.get_by_path_token(db, path_token=path_token)
 
     # Build the full URL expected by Twilio signature validation:
     # TWILIO_PUBLIC_BASE_URL must be set and webhook path is /api/v1/integrations/connectors/whatsapp/twilio/{path_token}
@@ -146,14 +210,39 @@ async def twilio_webhook(path_token: str, request: Request, db: Session = Depend
         "source": "whatsapp",
         "connector_type": "twilio",
         "conversation_id": f"wh_tw:{from_number}",
+        "message_sid": params.get("MessageSid"),
         "sender_id": from_number,
         "text": body,
         "raw": params,
         "metadata": {"provider": "twilio"},
     }
-    reply_text = _process_and_respond(normalized, agent_user_info["agent_id"], agent_user_info["user_id"])
-    return PlainTextResponse(reply_text)
+    reply_to = {
+        "integration_id": integration.id,
+        "account_sid": integration.twilio_account_sid or params.get("AccountSid"),
+        "auth_token": integration.twilio_auth_token,
+        "from_number": integration.twilio_phone_number or params.get("To"),
+        "to_number": from_number,
+    }
+    agent_id, user_id = integration.agent_id, integration.user_id
 
+    if whatsapp_worker_pool.saturated:
+        # Twilio retries on 5xx; the message is not lost while the queue drains
+        raise HTTPException(status_code=503, detail="too many messages in flight", headers={"Retry-After": "5"})
+    if normalized["message_sid"]:
+        claimed, receipt = await whatsapp_message_ledger.claim(db, normalized["message_sid"], integration.id)
+        if not claimed:
+            # A retry of a message already being answered; its reply goes out through the Messages API
+            return Response(
+                content=EMPTY_TWIML,
+                media_type="application/xml",
+                headers={"X-Message-Status": receipt.status},
+            )
+    whatsapp_debouncer.add(
+        f"{integration.id}:{normalized['conversation_id']}",
+        normalized,
+        lambda batch: _process_and_reply(batch, agent_id, user_id, reply_to),
+    )
+    return Response(content=EMPTY_TWIML, media_type="application/xml")
 
 
 @router.get("/connectors/whatsapp/twilio/{path_token}")
@@ -191,6 +280,45 @@ def list_agent_whatsapp_integrations(
     return wa_integration_crud.get_for_agent(db, agent_id=agent_id, user_id=current_user.id)
 
 
+@router.put("/whatsapp/{integration_id}", response_model=WhatsAppIntegrationSchema)
+def update_whatsapp_integration(
+    integration_id: str,
+    payload: WhatsAppIntegrationUpdate,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user),
+):
+    """
+    Update a WhatsApp integration, e.g. set `enabled` to pause or resume it.
+    Only allows updates to integrations owned by the current user.
+    """
+    integration = wa_integration_crud.get(db, id=integration_id)
+    if not integration:
+        raise HTTPException(status_code=404, detail="Integration not found")
+    if integration.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this integration")
+    return wa_integration_crud.update(db, db_obj=integration, obj_in=payload)
+
+
+@router.get("/whatsapp/{integration_id}/dead-letters", response_model=list[WhatsAppDeadLetterSchema])
+def list_whatsapp_dead_letters(
+    integration_id: str,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user),
+):
+    """
+    List replies that could not be delivered through Twilio, newest first.
+    Only available for integrations owned by the current user.
+    """
+    integration = wa_integration_crud.get(db, id=integration_id)
+    if not integration:
+        raise HTTPException(status_code=404, detail="Integration not found")
+    if integration.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this integration")
+    return wa_dead_letter_crud.get_for_integration(db, integration_id=integration_id, skip=skip, limit=limit)
+
+
 @router.delete("/whatsapp/{integration_id}")
 def delete_whatsapp_integration(
     integration_id: str,
@@ -3,11 +3,13 @@ from .tool import tool_crud
 from .api_key import api_key_crud
 from .custom_gpt import custom_gpt_crud
 from .message import message_crud
+from .usage import usage_crud
 
 __all__ = [
     "agent_crud",
     "tool_crud", 
     "api_key_crud",
     "custom_gpt_crud",
-    "message_crud"
+    "message_crud",
+    "usage_crud"
 ]
@@ -1,9 +1,12 @@
 from typing import List, Optional
 import uuid
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.crud.base import CRUDBase
 from app.models.agent import Agent
 from app.schemas.agent import AgentCreate, AgentUpdate
+from app.utils.tool_manifest import agent_manifest_cache
 
 class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
     def create(self, db: Session, *, obj_in: AgentCreate, user_id: str) -> Agent:
@@ -32,6 +35,8 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
             "jsonResponse": db_obj.jsonResponse,
             "starterMessage": db_obj.starterMessage,
             "apiKeyId": db_obj.apiKeyId,
+            "useKeyPool": bool(db_obj.useKeyPool),
+            "hedgeRequests": bool(db_obj.hedgeRequests),
             "created_at": db_obj.created_at,
             "updated_at": db_obj.updated_at,
             "tools": [tool.id for tool in db_obj.tools] if db_obj.tools else []
@@ -51,6 +56,14 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
         if user_id:
             q = q.filter(Agent.user_id == user_id)
         return q.first()
+
+    async def aget(self, db: AsyncSession, id: str, user_id: Optional[str] = None) -> Optional[Agent]:
+        """Get agent by ID as database object on an async session"""
+        stmt = select(Agent).where(Agent.id == id)
+        if user_id:
+            stmt = stmt.where(Agent.user_id == user_id)
+        result = await db.execute(stmt)
+        return result.scalars().first()
     
     def get_formatted(self, db: Session, id: str, user_id: Optional[str] = None) -> Optional[dict]:
         """Get agent by ID with formatted response"""
@@ -64,6 +77,7 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
         """Update agent and return formatted response"""
         # Call parent update method
         updated_agent = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        agent_manifest_cache.invalidate_agent(updated_agent.id)
         return self._format_for_response(updated_agent)
 
     def get_multi(self, db: Session, *, skip: int = 0, limit: int = 100, user_id: Optional[str] = None) -> List[dict]:
@@ -74,6 +88,11 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
         agents = q.offset(skip).limit(limit).all()
         return [self._format_for_response(agent) for agent in agents]
 
+    def remove(self, db: Session, *, id: str) -> Agent:
+        agent = super().remove(db, id=id)
+        agent_manifest_cache.invalidate_agent(id)
+        return agent
+
     def assign_tool(self, db: Session, *, agent_id: str, tool_id: str) -> dict:
         """Assign a tool to an agent"""
         from app.models.tool import Tool
@@ -108,6 +127,7 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
                 db.commit()
                 db.refresh(agent)
                 db.refresh(tool)
+                agent_manifest_cache.invalidate_agent(agent_id)
         
         return self._format_for_response(agent) if agent else None
 
@@ -136,6 +156,7 @@ class CRUDAgent(CRUDBase[Agent, AgentCreate, AgentUpdate]):
             db.commit()
             db.refresh(agent)
             db.refresh(tool)
+            agent_manifest_cache.invalidate_agent(agent_id)
         
         return self._format_for_response(agent) if agent else None
 
@@ -1,5 +1,7 @@
 from typing import List, Optional
 import uuid
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.crud.base import CRUDBase
 from app.models.api_key import ApiKey
@@ -23,4 +25,8 @@ class CRUDApiKey(CRUDBase[ApiKey, ApiKeyCreate, ApiKeyUpdate]):
     def get_by_provider(self, db: Session, *, provider: str, user_id: str) -> List[ApiKey]:
         return db.query(ApiKey).filter(ApiKey.provider == provider, ApiKey.user_id == user_id).all()
 
+    async def aget_by_provider(self, db: AsyncSession, *, provider: str, user_id: str) -> List[ApiKey]:
+        result = await db.execute(select(ApiKey).where(ApiKey.provider == provider, ApiKey.user_id == user_id))
+        return list(result.scalars().all())
+
 api_key_crud = CRUDApiKey(ApiKey)
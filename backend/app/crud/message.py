@@ -1,32 +1,137 @@
 from typing import List, Optional
 import uuid
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.crud.base import CRUDBase
 from app.models.message import Message
 from app.schemas.message import MessageCreate
+from app.utils.context_window import message_tokens
 
 class CRUDMessage(CRUDBase[Message, MessageCreate, MessageCreate]):
     def create(self, db: Session, *, obj_in: MessageCreate) -> Message:
         """Create a new message with auto-generated ID"""
-        obj_in_data = obj_in.model_dump()
-        obj_in_data["id"] = str(uuid.uuid4())
+        obj_in_data = self._prepare(obj_in)
         db_obj = Message(**obj_in_data)
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
         return db_obj
 
-    def get_by_agent_and_user(self, db: Session, *, agent_id: str, user_id: str, limit: int = 50) -> List[Message]:
-        """Get messages for a specific agent and user, ordered by creation time"""
-        return db.query(Message).filter(
+    async def acreate_many(
+        self, db: AsyncSession, *, objs_in: List[MessageCreate], commit: bool = True
+    ) -> List[Message]:
+        """
+        Create several messages in one transaction with a single flush.
+
+        Rows are not refreshed; callers pass `created_at` when they need it back.
+        With `commit=False` the rows are only flushed, for callers that add more
+        to the transaction before committing.
+        """
+        db_objs = [Message(**self._prepare(obj_in)) for obj_in in objs_in]
+        db.add_all(db_objs)
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
+        return db_objs
+
+    def _prepare(self, obj_in: MessageCreate) -> dict:
+        """Column values for a new message, counting its tokens once at write time"""
+        obj_in_data = obj_in.model_dump()
+        obj_in_data["id"] = str(uuid.uuid4())
+        if obj_in_data.get("created_at") is None:
+            obj_in_data.pop("created_at", None)
+        if obj_in_data.get("token_count") is None:
+            obj_in_data["token_count"] = message_tokens(obj_in_data["content"], obj_in_data.get("tool_calls"))
+        return obj_in_data
+
+    def _in_thread(self, agent_id: str, user_id: str, conversation_id: Optional[str]) -> list:
+        """Filter for one conversation thread; None selects the default thread"""
+        return [
             Message.agent_id == agent_id,
-            Message.user_id == user_id
-        ).order_by(Message.created_at.asc()).limit(limit).all()
+            Message.user_id == user_id,
+            Message.conversation_id == conversation_id if conversation_id else Message.conversation_id.is_(None),
+        ]
 
-    def get_chat_history(self, db: Session, *, agent_id: str, user_id: str, limit: int = 50) -> List[dict]:
-        """Get formatted chat history for OpenAI API"""
-        messages = self.get_by_agent_and_user(db, agent_id=agent_id, user_id=user_id, limit=limit)
-        
+    def get_by_agent_and_user(
+        self,
+        db: Session,
+        *,
+        agent_id: str,
+        user_id: str,
+        conversation_id: Optional[str] = None,
+        limit: int = 50,
+        visible_only: bool = False
+    ) -> List[Message]:
+        """
+        Get the most recent `limit` messages of one conversation thread for an agent and user, oldest first.
+
+        With `visible_only`, tool results and assistant tool-call steps without
+        text are left out.
+        """
+        q = db.query(Message).filter(*self._in_thread(agent_id, user_id, conversation_id))
+        if visible_only:
+            q = q.filter(Message.role != "tool", Message.content != "")
+        messages = q.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
+        return messages[::-1]
+
+    def get_conversations(self, db: Session, *, agent_id: str, user_id: str) -> List[dict]:
+        """Threads of an agent/user history with their size and latest activity, most recent first"""
+        rows = (
+            db.query(Message.conversation_id, func.count(Message.id), func.max(Message.created_at))
+            .filter(Message.agent_id == agent_id, Message.user_id == user_id)
+            .group_by(Message.conversation_id)
+            .order_by(func.max(Message.created_at).desc())
+            .all()
+        )
+        return [
+            {"conversation_id": conversation_id, "messages": count, "last_message_at": last_message_at}
+            for conversation_id, count, last_message_at in rows
+        ]
+
+    async def aget_chat_history(
+        self,
+        db: AsyncSession,
+        *,
+        agent_id: str,
+        user_id: str,
+        token_budget: int,
+        max_messages: int = 200,
+        conversation_id: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Get the most recent messages of a conversation thread that fit in `token_budget`, oldest first.
+
+        A running token total over the newest messages is computed in SQL from
+        the stored token counts, so no message is re-tokenized. Rows written
+        before token counts were stored are estimated from their length.
+        """
+        tokens = func.coalesce(Message.token_count, func.length(Message.content) / 4 + 4)
+        recent = (
+            select(
+                Message.id,
+                func.sum(tokens).over(order_by=(Message.created_at.desc(), Message.id.desc())).label("running_tokens")
+            )
+            .where(*self._in_thread(agent_id, user_id, conversation_id))
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(max_messages)
+            .subquery()
+        )
+        result = await db.execute(
+            select(Message)
+            .join(recent, recent.c.id == Message.id)
+            .where(recent.c.running_tokens <= token_budget)
+            .order_by(Message.created_at.asc(), Message.id.asc())
+        )
+        messages = list(result.scalars().all())
+        # A window must not open on tool results whose assistant tool call was cut off
+        while messages and messages[0].role == "tool":
+            messages.pop(0)
+        return self._format_for_openai(messages)
+
+    def _format_for_openai(self, messages: List[Message]) -> List[dict]:
+        """Format message rows as OpenAI chat messages"""
         formatted_messages = []
         for msg in messages:
             message_dict = {
@@ -37,6 +142,7 @@ class CRUDMessage(CRUDBase[Message, MessageCreate, MessageCreate]):
             # Add tool_calls if present
             if msg.tool_calls:
                 message_dict["tool_calls"] = msg.tool_calls
+                message_dict["content"] = msg.content or None
             
             # Add tool_call_id if present (for tool responses)
             if msg.tool_call_id:
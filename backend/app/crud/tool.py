@@ -1,9 +1,14 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 import uuid
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.crud.base import CRUDBase
+from app.models.agent_tool_association import agent_tool_association
 from app.models.tool import Tool
 from app.schemas.tool import ToolCreate, ToolUpdate
+from app.utils.tool_cache import tool_result_cache
+from app.utils.tool_manifest import agent_manifest_cache
 
 class CRUDTool(CRUDBase[Tool, ToolCreate, ToolUpdate]):
     def create(self, db: Session, *, obj_in: ToolCreate, user_id: str) -> Tool:
@@ -17,10 +22,33 @@ class CRUDTool(CRUDBase[Tool, ToolCreate, ToolUpdate]):
         db.refresh(db_obj)
         return db_obj
 
+    def update(self, db: Session, *, db_obj: Tool, obj_in: Union[ToolUpdate, Dict[str, Any]]) -> Tool:
+        """Update tool and drop its cached results and the cached manifests of agents using it"""
+        tool = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        agent_manifest_cache.invalidate_tool(tool.id)
+        tool_result_cache.invalidate_tool(tool.id)
+        return tool
+
+    def remove(self, db: Session, *, id: str) -> Tool:
+        """Delete tool and drop its cached results and the cached manifests of agents using it"""
+        tool = super().remove(db, id=id)
+        agent_manifest_cache.invalidate_tool(id)
+        tool_result_cache.invalidate_tool(id)
+        return tool
+
     def get_by_type(self, db: Session, *, type: str, user_id: str) -> List[Tool]:
         return db.query(Tool).filter(Tool.type == type, Tool.user_id == user_id).all()
 
     def get_by_agent(self, db: Session, *, agent_id: str, user_id: str) -> List[Tool]:
         return db.query(Tool).filter(Tool.assignedAgents.contains([agent_id]), Tool.user_id == user_id).all()
 
+    async def aget_assigned(self, db: AsyncSession, *, agent_id: str) -> List[Tool]:
+        """Get the tools assigned to an agent through the association table"""
+        result = await db.execute(
+            select(Tool)
+            .join(agent_tool_association, agent_tool_association.c.tool_id == Tool.id)
+            .where(agent_tool_association.c.agent_id == agent_id)
+        )
+        return list(result.scalars().all())
+
 tool_crud = CRUDTool(Tool)
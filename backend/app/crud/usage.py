@@ -0,0 +1,127 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.agent import Agent
+from app.models.usage import AgentUsageDaily
+from app.utils import latency_histogram
+
+_COUNTERS = ("turns", "prompt_tokens", "completion_tokens", "cached_tokens", "llm_latency_ms", "tool_latency_ms")
+
+
+class CRUDUsage:
+    async def aaccumulate(
+        self,
+        db: AsyncSession,
+        *,
+        agent_id: str,
+        user_id: str,
+        day: date,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int,
+        llm_latency_ms: int,
+        tool_latency_ms: int,
+    ) -> AgentUsageDaily:
+        """
+        Add one turn to its daily aggregate row.
+
+        Does not commit: the caller commits together with the turn's messages,
+        so a turn is counted exactly when it is stored. The row stays locked
+        until that commit, so call this last, right before committing.
+        """
+        key = {"agent_id": agent_id, "user_id": user_id, "day": day}
+        counters = {
+            "turns": 1,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "llm_latency_ms": llm_latency_ms,
+            "tool_latency_ms": tool_latency_ms,
+        }
+        if db.bind.dialect.name == "postgresql":
+            # One atomic upsert; concurrent turns add to the row without reading it first
+            statement = pg_insert(AgentUsageDaily).values(**key, **counters)
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=list(key),
+                set_={
+                    **{name: getattr(AgentUsageDaily, name) + statement.excluded[name] for name in _COUNTERS},
+                    "updated_at": func.now(),
+                },
+            ))
+            # Already locked by the upsert, so reading the histograms back does not wait
+            row = await db.get(AgentUsageDaily, key, populate_existing=True)
+        else:
+            row = await db.get(AgentUsageDaily, key, with_for_update=True, populate_existing=True)
+            if row is None:
+                row = AgentUsageDaily(**key, **{name: 0 for name in _COUNTERS})
+                db.add(row)
+            for name in _COUNTERS:
+                setattr(row, name, getattr(row, name) + counters[name])
+
+        # Reassigned rather than mutated so the JSON columns are flagged dirty
+        row.latency_histogram = latency_histogram.observe(row.latency_histogram, llm_latency_ms + tool_latency_ms)
+        row.llm_latency_histogram = latency_histogram.observe(row.llm_latency_histogram, llm_latency_ms)
+        return row
+
+    def get_stats(
+        self,
+        db: Session,
+        *,
+        owner_id: str,
+        agent_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        group_by: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Roll daily aggregates of the owner's agents up into totals and, optionally,
+        groups keyed by `day`, `agent` or `user`. Reads only the aggregate table.
+        """
+        query = (
+            db.query(AgentUsageDaily)
+            .join(Agent, Agent.id == AgentUsageDaily.agent_id)
+            .filter(Agent.user_id == owner_id)
+        )
+        if agent_id:
+            query = query.filter(AgentUsageDaily.agent_id == agent_id)
+        if user_id:
+            query = query.filter(AgentUsageDaily.user_id == user_id)
+        if start:
+            query = query.filter(AgentUsageDaily.day >= start)
+        if end:
+            query = query.filter(AgentUsageDaily.day <= end)
+        rows = query.all()
+
+        result: Dict[str, Any] = {"totals": self._summarize(rows), "groups": []}
+        if group_by:
+            attribute = {"day": "day", "agent": "agent_id", "user": "user_id"}[group_by]
+            grouped: Dict[str, List[AgentUsageDaily]] = {}
+            for row in rows:
+                grouped.setdefault(str(getattr(row, attribute)), []).append(row)
+            result["groups"] = [
+                {"key": key, **self._summarize(group_rows)}
+                for key, group_rows in sorted(grouped.items())
+            ]
+        return result
+
+    def _summarize(self, rows: List[AgentUsageDaily]) -> Dict[str, Any]:
+        totals = {name: sum(getattr(row, name) or 0 for row in rows) for name in _COUNTERS}
+        latency = latency_histogram.merge(row.latency_histogram for row in rows)
+        llm_latency = latency_histogram.merge(row.llm_latency_histogram for row in rows)
+        return {
+            **totals,
+            "total_tokens": totals["prompt_tokens"] + totals["completion_tokens"],
+            "latency_p50_ms": latency_histogram.percentile(latency, 50),
+            "latency_p95_ms": latency_histogram.percentile(latency, 95),
+            "llm_latency_p50_ms": latency_histogram.percentile(llm_latency, 50),
+            "llm_latency_p95_ms": latency_histogram.percentile(llm_latency, 95),
+        }
+
+
+usage_crud = CRUDUsage()
@@ -0,0 +1,51 @@
+import uuid
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.whatsapp_dead_letter import WhatsAppDeadLetter
+
+
+class CRUDWhatsAppDeadLetter:
+    async def acreate(
+        self,
+        db: AsyncSession,
+        *,
+        integration_id: Optional[str],
+        from_number: str,
+        to_number: str,
+        body: str,
+        attempts: int,
+        status_code: Optional[int],
+        last_error: Optional[str],
+    ) -> WhatsAppDeadLetter:
+        dead_letter = WhatsAppDeadLetter(
+            id=str(uuid.uuid4()),
+            integration_id=integration_id,
+            from_number=from_number,
+            to_number=to_number,
+            body=body,
+            attempts=attempts,
+            status_code=status_code,
+            last_error=last_error,
+        )
+        db.add(dead_letter)
+        await db.commit()
+        return dead_letter
+
+    def get_for_integration(
+        self, db: Session, *, integration_id: str, skip: int = 0, limit: int = 100
+    ) -> List[WhatsAppDeadLetter]:
+        """Newest first"""
+        return (
+            db.query(WhatsAppDeadLetter)
+            .filter(WhatsAppDeadLetter.integration_id == integration_id)
+            .order_by(WhatsAppDeadLetter.created_at.desc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+
+
+wa_dead_letter_crud = CRUDWhatsAppDeadLetter()
@@ -1,5 +1,7 @@
 import uuid
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.crud.base import CRUDBase
 from app.models.whatsapp_integration import WhatsAppIntegration as WAIntegrationModel
@@ -7,6 +9,7 @@ from app.schemas.whatsapp_integration import (
     WhatsAppIntegrationCreate,
     WhatsAppIntegrationUpdate,
 )
+from app.utils.integration_cache import whatsapp_integration_cache
 
 
 class CRUDWhatsAppIntegration(
@@ -22,11 +25,38 @@ class CRUDWhatsAppIntegration(
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        whatsapp_integration_cache.invalidate(db_obj.path_token)
         return db_obj
 
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: WAIntegrationModel,
+        obj_in: Union[WhatsAppIntegrationUpdate, Dict[str, Any]]
+    ) -> WAIntegrationModel:
+        """Update integration (e.g. toggle `enabled`) and drop its cached webhook route"""
+        integration = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        whatsapp_integration_cache.invalidate(integration.path_token)
+        return integration
+
+    def remove(self, db: Session, *, id: str) -> WAIntegrationModel:
+        """Delete integration and drop its cached webhook route"""
+        integration = self.get(db, id=id)
+        # Read before the delete expires the instance
+        path_token = integration.path_token if integration else None
+        integration = super().remove(db, id=id)
+        if path_token:
+            whatsapp_integration_cache.invalidate(path_token)
+        return integration
+
     def get_by_path_token(self, db: Session, *, path_token: str) -> Optional[WAIntegrationModel]:
         return db.query(WAIntegrationModel).filter(WAIntegrationModel.path_token == path_token).first()
 
+    async def aget_by_path_token(self, db: AsyncSession, *, path_token: str) -> Optional[WAIntegrationModel]:
+        result = await db.execute(select(WAIntegrationModel).where(WAIntegrationModel.path_token == path_token))
+        return result.scalars().first()
+
     def get_for_agent(self, db: Session, *, agent_id: str, user_id: str) -> List[WAIntegrationModel]:
         return (
             db.query(WAIntegrationModel)
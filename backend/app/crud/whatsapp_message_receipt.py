@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.whatsapp_message_receipt import WhatsAppMessageReceipt
+
+
+class CRUDWhatsAppMessageReceipt:
+    async def aclaim(
+        self,
+        db: AsyncSession,
+        *,
+        message_sid: str,
+        integration_id: str,
+        ttl: float,
+    ) -> Tuple[bool, WhatsAppMessageReceipt]:
+        """
+        Record that `message_sid` is being processed.
+
+        Returns `(claimed, receipt)`: claimed is False when a live receipt
+        already exists, i.e. the webhook is a retry. Expired receipts and
+        failed attempts are taken over.
+        """
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=ttl)
+        receipt = WhatsAppMessageReceipt(
+            message_sid=message_sid,
+            integration_id=integration_id,
+            status="processing",
+            expires_at=expires_at,
+        )
+        db.add(receipt)
+        try:
+            await db.commit()
+            return True, receipt
+        except IntegrityError:
+            # Another delivery of the same message got there first
+            await db.rollback()
+
+        existing = await db.get(WhatsAppMessageReceipt, message_sid, with_for_update=True, populate_existing=True)
+        if existing is None:
+            # Pruned in between; the next delivery claims it
+            return False, receipt
+        if existing.status != "failed" and _aware(existing.expires_at) > now:
+            await db.commit()
+            return False, existing
+        existing.integration_id = integration_id
+        existing.status = "processing"
+        existing.reply_text = None
+        existing.expires_at = expires_at
+        await db.commit()
+        return True, existing
+
+    async def afinish(
+        self,
+        db: AsyncSession,
+        *,
+        message_sids: Iterable[str],
+        status: str,
+        reply_text: Optional[str] = None,
+    ) -> None:
+        """Mark the receipts of one answered batch as `replied` or `failed`"""
+        await db.execute(
+            update(WhatsAppMessageReceipt)
+            .where(WhatsAppMessageReceipt.message_sid.in_(list(message_sids)))
+            .values(status=status, reply_text=reply_text)
+        )
+        await db.commit()
+
+    async def aprune(self, db: AsyncSession) -> int:
+        """Delete expired receipts; returns how many were removed"""
+        result = await db.execute(
+            delete(WhatsAppMessageReceipt).where(WhatsAppMessageReceipt.expires_at <= datetime.now(timezone.utc))
+        )
+        await db.commit()
+        return result.rowcount or 0
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone-aware columns
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+wa_message_receipt_crud = CRUDWhatsAppMessageReceipt()
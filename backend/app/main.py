@@ -3,6 +3,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.api.v1.api import api_router
 from app.database import engine, Base
+import asyncio
+from app.utils.circuit_breaker import tool_breakers
+from app.utils.llm_clients import llm_client_registry
+from app.utils.tool_http import tool_http_pool
+from app.utils.message_debouncer import whatsapp_debouncer
+from app.utils.message_ledger import whatsapp_message_ledger
+from app.utils.outbound_messages import whatsapp_outbound
+from app.utils.twilio_messages import twilio_messages
+from app.utils.worker_pool import whatsapp_worker_pool
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -25,6 +34,54 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
+@app.on_event("startup")
+async def prewarm_llm_clients():
+    try:
+        warmed = await llm_client_registry.prewarm()
+        print(f"Pre-connected {warmed} LLM client(s)")
+    except Exception as e:
+        print(f"Skipping LLM client pre-connect: {e}")
+
+@app.on_event("startup")
+async def start_tool_health_probes():
+    app.state.tool_probe_task = asyncio.create_task(
+        tool_breakers.run_health_probes(settings.TOOL_BREAKER_PROBE_INTERVAL)
+    )
+
+@app.on_event("startup")
+async def start_whatsapp_workers():
+    whatsapp_worker_pool.start()
+
+@app.on_event("startup")
+async def start_whatsapp_receipt_pruning():
+    app.state.receipt_prune_task = asyncio.create_task(
+        whatsapp_message_ledger.run_pruning(settings.WHATSAPP_RECEIPT_PRUNE_INTERVAL)
+    )
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await llm_client_registry.aclose()
+
+@app.on_event("shutdown")
+async def stop_tool_health_probes():
+    app.state.tool_probe_task.cancel()
+
+@app.on_event("shutdown")
+async def close_tool_http_clients():
+    await tool_http_pool.aclose()
+
+@app.on_event("shutdown")
+async def stop_whatsapp_receipt_pruning():
+    app.state.receipt_prune_task.cancel()
+
+@app.on_event("shutdown")
+async def stop_whatsapp_workers():
+    # Answer buffered messages and let queued replies go out before the Twilio client is closed
+    whatsapp_debouncer.flush_all()
+    await whatsapp_worker_pool.stop()
+    await whatsapp_outbound.stop()
+    await twilio_messages.aclose()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Synapse API"}
@@ -6,6 +6,9 @@ from .agent_tool_association import agent_tool_association
 from .message import Message
 from .user import User
 from .whatsapp_integration import WhatsAppIntegration
+from .whatsapp_message_receipt import WhatsAppMessageReceipt
+from .whatsapp_dead_letter import WhatsAppDeadLetter
+from .usage import AgentUsageDaily
 
 __all__ = [
     "Agent",
@@ -15,5 +18,8 @@ __all__ = [
     "agent_tool_association",
     "Message",
     "User",
-    "WhatsAppIntegration"
+    "WhatsAppIntegration",
+    "WhatsAppMessageReceipt",
+    "WhatsAppDeadLetter",
+    "AgentUsageDaily"
 ]
@@ -18,6 +18,8 @@ class Agent(Base):
     jsonResponse = Column(Boolean, default=False)
     starterMessage = Column(Text, default="Hi! I'm your AI assistant. How can I help you today?")
     apiKeyId = Column(String, ForeignKey("api_keys.id"))
+    useKeyPool = Column(Boolean, default=False)  # Balance over all of the owner's keys for the provider
+    hedgeRequests = Column(Boolean, default=False)  # Race a second key when a call passes its p95 latency
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Integer
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -11,6 +11,8 @@ class ApiKey(Base):
     key = Column(String, nullable=False)
     provider = Column(String, nullable=False)  # "openai", "anthropic", "azure-openai", "other"
     is_azure = Column(Boolean, default=False)
+    rpm_limit = Column(Integer, nullable=True)  # Requests per minute, None for the server default
+    tpm_limit = Column(Integer, nullable=True)  # Tokens per minute, None for the server default
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -9,12 +9,24 @@ class Message(Base):
     id = Column(String, primary_key=True, index=True)
     agent_id = Column(String, ForeignKey("agents.id"), nullable=False)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    conversation_id = Column(String)  # Thread within the agent/user history, e.g. "wh_tw:<sender>"; NULL is the default thread
     role = Column(String, nullable=False)  # "user", "assistant", "system", "tool"
     content = Column(Text, nullable=False)
     tool_calls = Column(JSON)  # Store tool calls as JSON
     tool_call_id = Column(String)  # For tool responses
+    token_count = Column(Integer)  # Prompt tokens this message costs, counted at write time
+    # Provider usage and timing of the turn, set on the final assistant message
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    cached_tokens = Column(Integer)
+    llm_latency_ms = Column(Integer)
+    tool_latency_ms = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_messages_agent_user_conversation_created_at", "agent_id", "user_id", "conversation_id", "created_at"),
+    )
+
     # Relationship with agent
     agent = relationship("Agent", back_populates="messages")
     user = relationship("User", back_populates="messages")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, ARRAY, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ARRAY, JSON, ForeignKey
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -18,6 +18,11 @@ class Tool(Base):
     assignedAgents = Column(ARRAY(String))  # Array of agent IDs using this tool
     baseUrl = Column(String)  # Base URL for external tool service calls
     secretCode = Column(String)  # Bearer token for authenticating tool calls
+    cacheable = Column(Boolean, default=False)  # Results are idempotent and may be served from cache
+    cacheTtl = Column(Integer)  # Seconds to cache results, defaults to TOOL_RESULT_CACHE_TTL
+    supportsBatch = Column(Boolean, default=False)  # Service accepts several calls at once on {baseUrl}/Batch
+    resultFields = Column(JSON)  # JSON paths projected out of results before they reach the model
+    resultMaxTokens = Column(Integer)  # Max tokens a result may take, defaults to TOOL_RESULT_MAX_TOKENS
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
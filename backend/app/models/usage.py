@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, Integer, BigInteger, Date, DateTime, ForeignKey, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class AgentUsageDaily(Base):
+    """Token and latency totals per agent, chatting user and UTC day, updated with every turn"""
+    __tablename__ = "agent_usage_daily"
+
+    agent_id = Column(String, ForeignKey("agents.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    turns = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    cached_tokens = Column(BigInteger, nullable=False, default=0)
+    llm_latency_ms = Column(BigInteger, nullable=False, default=0)  # Sum over turns
+    tool_latency_ms = Column(BigInteger, nullable=False, default=0)  # Sum over turns
+    latency_histogram = Column(JSON)  # Turn latency (LLM + tools) bucket counts
+    llm_latency_histogram = Column(JSON)  # LLM latency bucket counts
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
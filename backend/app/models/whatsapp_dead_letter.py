@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class WhatsAppDeadLetter(Base):
+    """An outbound WhatsApp reply that Twilio did not accept after all retries"""
+    __tablename__ = "whatsapp_dead_letters"
+
+    id = Column(String, primary_key=True, index=True)
+    integration_id = Column(String, ForeignKey("whatsapp_integrations.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    from_number = Column(String, nullable=False)
+    to_number = Column(String, nullable=False)
+    body = Column(Text, nullable=False)  # The parts that were not sent, in order
+
+    attempts = Column(Integer, nullable=False, default=0)
+    status_code = Column(Integer, nullable=True)  # Twilio's HTTP status, None for network errors
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
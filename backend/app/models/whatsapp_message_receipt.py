@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class WhatsAppMessageReceipt(Base):
+    """One row per inbound Twilio MessageSid, so webhook retries are answered once"""
+    __tablename__ = "whatsapp_message_receipts"
+
+    message_sid = Column(String, primary_key=True)
+    integration_id = Column(String, ForeignKey("whatsapp_integrations.id", ondelete="CASCADE"), nullable=False)
+
+    status = Column(String, nullable=False, default="processing")  # processing, replied or failed
+    reply_text = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -4,6 +4,7 @@ from .api_key import ApiKey, ApiKeyCreate, ApiKeyUpdate
 from .custom_gpt import CustomGPT, CustomGPTCreate, CustomGPTUpdate
 from .message import Message, MessageCreate, ChatRequest, ChatResponse
 from .user import User, UserCreate, UserUpdate, UserLogin, Token, TokenPayload
+from .usage import UsageStats, UsageStatsGroup, UsageStatsResponse
 
 __all__ = [
     "Agent", "AgentCreate", "AgentUpdate",
@@ -11,5 +12,6 @@ __all__ = [
     "ApiKey", "ApiKeyCreate", "ApiKeyUpdate",
     "CustomGPT", "CustomGPTCreate", "CustomGPTUpdate",
     "Message", "MessageCreate", "ChatRequest", "ChatResponse",
-    "User", "UserCreate", "UserUpdate", "UserLogin", "Token", "TokenPayload"
+    "User", "UserCreate", "UserUpdate", "UserLogin", "Token", "TokenPayload",
+    "UsageStats", "UsageStatsGroup", "UsageStatsResponse"
 ]
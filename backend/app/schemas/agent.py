@@ -14,6 +14,8 @@ class AgentBase(BaseModel):
     jsonResponse: bool = False
     starterMessage: str = "Hi! I'm your AI assistant. How can I help you today?"
     apiKeyId: Optional[str] = None
+    useKeyPool: bool = False
+    hedgeRequests: bool = False
 
 class AgentCreate(AgentBase):
     pass
@@ -30,6 +32,8 @@ class AgentUpdate(BaseModel):
     jsonResponse: Optional[bool] = None
     starterMessage: Optional[str] = None
     apiKeyId: Optional[str] = None
+    useKeyPool: Optional[bool] = None
+    hedgeRequests: Optional[bool] = None
 
 class Agent(AgentBase):
     id: str
@@ -7,6 +7,8 @@ class ApiKeyBase(BaseModel):
     key: str
     provider: str  # "openai", "anthropic", "azure-openai", "other"
     is_azure: bool = False
+    rpm_limit: Optional[int] = None
+    tpm_limit: Optional[int] = None
 
 class ApiKeyCreate(ApiKeyBase):
     pass
@@ -16,6 +18,8 @@ class ApiKeyUpdate(BaseModel):
     key: Optional[str] = None
     provider: Optional[str] = None
     is_azure: Optional[bool] = None
+    rpm_limit: Optional[int] = None
+    tpm_limit: Optional[int] = None
 
 class ApiKey(ApiKeyBase):
     id: str
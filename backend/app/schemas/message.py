@@ -5,13 +5,20 @@ from datetime import datetime
 class MessageBase(BaseModel):
     agent_id: str
     user_id: str
+    conversation_id: Optional[str] = None  # Thread within the agent/user history, None for the default thread
     role: str  # "user", "assistant", "system", "tool"
     content: str
-    tool_calls: Optional[Dict[str, Any]] = None
+    tool_calls: Optional[List[Dict[str, Any]]] = None
     tool_call_id: Optional[str] = None
+    token_count: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    llm_latency_ms: Optional[int] = None
+    tool_latency_ms: Optional[int] = None
 
 class MessageCreate(MessageBase):
-    pass
+    created_at: Optional[datetime] = None  # Set by the chat engine to keep a turn's messages in order
 
 class Message(MessageBase):
     id: str
@@ -23,10 +30,11 @@ class Message(MessageBase):
 class ChatRequest(BaseModel):
     agent_id: str
     message_content: str
+    conversation_id: Optional[str] = None  # Separate thread to read and write, None for the default thread
 
 class ChatResponse(BaseModel):
     message_id: str
     content: str
     role: str = "assistant"
-    tool_calls: Optional[Dict[str, Any]] = None
+    tool_calls: Optional[List[Dict[str, Any]]] = None  # Tool calls made while producing this reply
     created_at: datetime
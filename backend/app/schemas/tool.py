@@ -14,6 +14,11 @@ class ToolBase(BaseModel):
     assignedAgents: Optional[List[str]] = None
     baseUrl: Optional[str] = None  # Base URL for external tool service calls
     secretCode: Optional[str] = None  # Bearer token for authenticating tool calls
+    cacheable: bool = False  # Results are idempotent and may be served from cache
+    cacheTtl: Optional[int] = None  # Seconds to cache results, defaults to TOOL_RESULT_CACHE_TTL
+    supportsBatch: bool = False  # Service accepts several calls at once on {baseUrl}/Batch
+    resultFields: Optional[List[str]] = None  # JSON paths, e.g. "$.items[*].name", kept from results
+    resultMaxTokens: Optional[int] = None  # Max tokens a result may take, defaults to TOOL_RESULT_MAX_TOKENS
 
 class ToolCreate(ToolBase):
     pass
@@ -30,6 +35,11 @@ class ToolUpdate(BaseModel):
     assignedAgents: Optional[List[str]] = None
     baseUrl: Optional[str] = None
     secretCode: Optional[str] = None
+    cacheable: Optional[bool] = None
+    cacheTtl: Optional[int] = None
+    supportsBatch: Optional[bool] = None
+    resultFields: Optional[List[str]] = None
+    resultMaxTokens: Optional[int] = None
 
 class Tool(ToolBase):
     id: str
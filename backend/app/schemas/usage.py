@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class UsageStats(BaseModel):
+    turns: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    total_tokens: int
+    llm_latency_ms: int  # Sum over turns
+    tool_latency_ms: int  # Sum over turns
+    latency_p50_ms: Optional[int] = None  # LLM + tool time per turn, bucketed
+    latency_p95_ms: Optional[int] = None
+    llm_latency_p50_ms: Optional[int] = None
+    llm_latency_p95_ms: Optional[int] = None
+
+
+class UsageStatsGroup(UsageStats):
+    key: str  # Day (YYYY-MM-DD), agent id or user id, depending on group_by
+
+
+class UsageStatsResponse(BaseModel):
+    totals: UsageStats
+    groups: List[UsageStatsGroup] = []
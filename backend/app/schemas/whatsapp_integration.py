@@ -35,3 +35,18 @@ class WhatsAppIntegration(WhatsAppIntegrationBase):
         from_attributes = True
 
 
+
+
+class WhatsAppDeadLetter(BaseModel):
+    id: str
+    integration_id: Optional[str] = None
+    from_number: str
+    to_number: str
+    body: str
+    attempts: int
+    status_code: Optional[int] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,799 @@
+import asyncio
+import json
+import math
+import time
+import traceback
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from openai import APITimeoutError, RateLimitError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.crud import agent_crud, message_crud, api_key_crud, tool_crud, usage_crud
+from app.database import AsyncSessionLocal
+from app.models.agent import Agent
+from app.models.api_key import ApiKey
+from app.models.message import Message
+from app.schemas.message import ChatResponse, MessageCreate
+from app.utils.circuit_breaker import tool_breakers
+from app.utils.context_window import history_token_budget, message_tokens
+from app.utils.key_balancer import key_balancer
+from app.utils.llm_clients import llm_client_registry
+from app.utils.rate_limiter import RateLimitExceeded, llm_rate_limiter, retry_after_seconds
+from app.utils.tool_manifest import AgentManifest, ToolBinding, agent_manifest_cache, compile_agent_manifest
+from app.utils.tool_cache import tool_cache_key, tool_result_cache
+from app.utils.tool_results import shape_tool_result
+from app.utils.tool_utils import ToolCallError, call_external_tool, call_external_tool_batch
+
+# Define a maximum number of rounds per turn in which a tool may fail
+MAX_RETRIES = 3
+
+# Provider 429s absorbed per model call before the client gets a 429
+MAX_RATE_LIMIT_RETRIES = 3
+
+# Reply used when a turn's budget runs out before the model produced any text
+BUDGET_EXHAUSTED_REPLY = "Sorry, I couldn't finish working on this in time. Please try again or narrow down the request."
+
+# Seconds below which a turn's deadline is treated as spent
+MIN_CALL_TIME = 1.0
+
+# Schema violations reported back to the model per tool call
+MAX_ARGUMENT_ERRORS = 3
+
+
+class _ToolBatch:
+    """
+    Collects the calls of one turn that go to the same batch-capable service.
+
+    Each member call either joins with `call` or drops out with `withdraw`
+    (cache hit, bad arguments); once every member has done one or the other,
+    the joined calls are sent as a single batch request.
+    """
+
+    def __init__(self, binding: ToolBinding, size: int, semaphore: asyncio.Semaphore, deadline: float):
+        self.binding = binding
+        self.semaphore = semaphore
+        self.deadline = deadline
+        self._waiting = size
+        self._calls: List[Tuple[str, str, Dict[str, Any]]] = []
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def call(self, tool_id: str, tool_name: str, tool_args: Dict[str, Any]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._calls.append((tool_id, tool_name, tool_args))
+        self._futures[tool_id] = future
+        self._leave()
+        return await future
+
+    def withdraw(self) -> None:
+        self._leave()
+
+    def _leave(self) -> None:
+        self._waiting -= 1
+        if self._waiting == 0 and self._calls:
+            self._task = asyncio.ensure_future(self._send())
+
+    async def _send(self) -> None:
+        try:
+            async with self.semaphore:
+                items = await call_external_tool_batch(
+                    self.binding.base_url,
+                    self._calls,
+                    self.binding.secret_code,
+                    timeout=self.deadline - time.monotonic(),
+                )
+        except Exception as e:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for tool_id, future in self._futures.items():
+            if future.done():
+                continue
+            item = items.get(tool_id)
+            if item is None:
+                future.set_exception(ToolCallError("The tool service returned no result for this call", endpoint_failure=False))
+            elif item.get("error") is not None:
+                future.set_exception(ToolCallError(str(item["error"]), endpoint_failure=False))
+            else:
+                future.set_result(item.get("result"))
+
+
+def _argument_error(manifest: AgentManifest, tool_name: str, tool_args: Any) -> Optional[str]:
+    """Check arguments against the function's compiled `parameters` schema; returns the problem for the model, if any"""
+    validator = manifest.validators.get(tool_name)
+    if validator is None:
+        return None
+    errors = sorted(validator.iter_errors(tool_args), key=lambda error: error.json_path)
+    if not errors:
+        return None
+    details = "; ".join(f"{error.json_path}: {error.message}" for error in errors[:MAX_ARGUMENT_ERRORS])
+    return f"Invalid arguments for {tool_name}: {details}"
+
+
+async def _run_tool_call(
+    tool_call: Dict[str, Any],
+    manifest: AgentManifest,
+    semaphore: asyncio.Semaphore,
+    failures: Dict[str, int],
+    failed_this_round: Set[str],
+    deadline: float,
+    batch: Optional[_ToolBatch] = None,
+) -> Dict[str, Any]:
+    """Execute one tool call, alone or as part of `batch`, and return the `tool` message carrying its result or error"""
+    tool_name = tool_call["function"]["name"]
+    tool_id = tool_call["id"]
+    joined_batch = False
+
+    try:
+        tool_args = json.loads(tool_call["function"]["arguments"] or "{}")
+        print(f"Tool call ({tool_id}): {tool_name}({tool_args})")
+
+        # Get base URL for this tool
+        binding = manifest.functions.get(tool_name)
+        if not binding or not binding.base_url:
+            raise Exception(f"No base URL configured for tool: {tool_name}")
+
+        # Reject arguments that break the schema without a round trip to the tool service.
+        # The tool itself did not fail, so this does not count towards MAX_RETRIES.
+        argument_error = _argument_error(manifest, tool_name, tool_args)
+        if argument_error:
+            print(f"Tool call ({tool_id}) rejected: {argument_error}")
+            return {
+                "role": "tool",
+                "tool_call_id": tool_id,
+                "content": json.dumps({"error": argument_error})
+            }
+
+        # Idempotent tools may be answered from the result cache
+        cache_key = None
+        hit, result = False, None
+        if binding.cache_ttl:
+            cache_key = tool_cache_key(binding.tool_id, tool_name, tool_args)
+            hit, result = tool_result_cache.get(cache_key, tool_name)
+
+        if not hit:
+            if batch is not None:
+                joined_batch = True
+                result = await batch.call(tool_id, tool_name, tool_args)
+            else:
+                # Call external tool service with Authorization header if secretCode is present
+                async with semaphore:
+                    result = await call_external_tool(
+                        binding.base_url,
+                        tool_name,
+                        tool_args,
+                        binding.secret_code,
+                        timeout=deadline - time.monotonic(),
+                    )
+            # Project and cap the result before it is cached or reaches the model
+            result = shape_tool_result(result, binding.result_paths, binding.result_max_tokens)
+            if cache_key:
+                tool_result_cache.put(cache_key, result, binding.cache_ttl)
+
+        return {
+            "role": "tool",
+            "tool_call_id": tool_id,
+            "content": json.dumps(result)
+        }
+
+    except Exception as e:
+        # Sibling calls failing together (e.g. one failed batch) count as one failure
+        if tool_name not in failed_this_round:
+            failed_this_round.add(tool_name)
+            failures[tool_name] = failures.get(tool_name, 0) + 1
+
+        if failures[tool_name] >= MAX_RETRIES:
+            # After 3 retries, inform the user
+            raise HTTPException(status_code=500, detail=f"⚠️ I tried 3 times to run `{tool_name}` but it kept failing. Last error: {str(e)}")
+
+        # Send error back so model can retry with corrected args
+        return {
+            "role": "tool",
+            "tool_call_id": tool_id,
+            "content": json.dumps({"error": str(e)})
+        }
+
+    finally:
+        if batch is not None and not joined_batch:
+            batch.withdraw()
+
+
+def _start_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    manifest: AgentManifest,
+    failures: Dict[str, int],
+    deadline: float,
+) -> List[asyncio.Task]:
+    """
+    Schedule the tool calls of one assistant message concurrently.
+
+    At most TOOL_CALL_CONCURRENCY requests are in flight at once and none
+    runs past `deadline` (monotonic). Calls to the same batch-capable service
+    share one request. The returned tasks are in the order of `tool_calls`.
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.TOOL_CALL_CONCURRENCY))
+    failed_this_round: Set[str] = set()
+
+    # Group calls per batch-capable service; a batch needs at least two calls
+    groups: Dict[Tuple[str, Optional[str]], Tuple[ToolBinding, List[str]]] = {}
+    for tool_call in tool_calls:
+        binding = manifest.functions.get(tool_call["function"]["name"])
+        if binding and binding.batch and binding.base_url:
+            key = (binding.base_url.rstrip('/'), binding.secret_code)
+            groups.setdefault(key, (binding, []))[1].append(tool_call["id"])
+    batches: Dict[str, _ToolBatch] = {}
+    for binding, tool_ids in groups.values():
+        if len(tool_ids) > 1:
+            batch = _ToolBatch(binding, len(tool_ids), semaphore, deadline)
+            batches.update((tool_id, batch) for tool_id in tool_ids)
+
+    return [
+        asyncio.ensure_future(_run_tool_call(
+            tool_call, manifest, semaphore, failures, failed_this_round, deadline, batches.get(tool_call["id"])
+        ))
+        for tool_call in tool_calls
+    ]
+
+
+async def _run_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    manifest: AgentManifest,
+    failures: Dict[str, int],
+    deadline: float,
+) -> List[Dict[str, Any]]:
+    """Run the tool calls of one assistant message and return their results in `tool_call_id` order"""
+    results = await asyncio.gather(
+        *_start_tool_calls(tool_calls, manifest, failures, deadline),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+@dataclass
+class ChatTurn:
+    """Everything a chat turn needs once the agent, key and history are loaded"""
+    agent_id: str
+    user_id: str
+    agent: Agent
+    api_keys: List[ApiKey]  # The agent's key, or its whole key pool
+    messages_history: List[Dict[str, Any]]
+    manifest: AgentManifest
+    conversation_id: Optional[str] = None  # Thread the turn reads and writes, None for the default thread
+    # Messages produced during the turn, written together once it completes (only the user's if it fails)
+    pending_messages: List[MessageCreate] = field(default_factory=list)
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    # Tool rounds in which each tool name failed, bounded by the lifetime of the turn
+    tool_failures: Dict[str, int] = field(default_factory=dict)
+    # Generation budget: monotonic deadline and tool rounds used so far
+    deadline: float = field(default_factory=lambda: time.monotonic() + settings.CHAT_TURN_TIMEOUT)
+    tool_rounds: int = 0
+    partial_content: str = ""  # Latest text the model produced during the turn
+    # Provider usage and time spent in model and tool calls, summed over the turn
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    llm_seconds: float = 0.0
+    tool_seconds: float = 0.0
+    # (api_key_id, estimated tokens) of the stream being read; settled once its usage chunk arrives
+    stream_reservation: Optional[Tuple[str, int]] = None
+    _last_created_at: Optional[datetime] = None
+
+    def add_message(self, message: Dict[str, Any], token_count: Optional[int] = None, **accounting: int) -> None:
+        """Append a message to the prompt and queue it for persistence, with optional usage columns"""
+        self.messages_history.append(message)
+        # Strictly increasing timestamps keep the turn's rows in order on replay
+        created_at = datetime.now(timezone.utc)
+        if self._last_created_at and created_at <= self._last_created_at:
+            created_at = self._last_created_at + timedelta(microseconds=1)
+        self._last_created_at = created_at
+        self.pending_messages.append(MessageCreate(
+            agent_id=self.agent_id,
+            user_id=self.user_id,
+            conversation_id=self.conversation_id,
+            role=message["role"],
+            content=message.get("content") or "",
+            tool_calls=message.get("tool_calls"),
+            tool_call_id=message.get("tool_call_id"),
+            token_count=token_count,
+            created_at=created_at,
+            **accounting
+        ))
+
+    def add_tool_round(self, content: Optional[str], tool_calls: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> None:
+        """Record an assistant tool-call message followed by its tool results"""
+        # The assistant message carrying the tool calls must precede their results
+        self.add_message({"role": "assistant", "content": content or None, "tool_calls": tool_calls})
+        for result in results:
+            self.add_message(result)
+        self.tool_calls.extend(tool_calls)
+        self.tool_rounds += 1
+        if content:
+            self.partial_content = content
+
+    def record_usage(self, usage: Any) -> None:
+        """Add the `usage` block of one completion to the turn's totals"""
+        if not usage:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += getattr(details, "cached_tokens", None) or 0
+
+    def time_left(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def out_of_time(self) -> bool:
+        return self.time_left() < MIN_CALL_TIME
+
+    def out_of_tool_rounds(self) -> bool:
+        return self.tool_rounds >= settings.CHAT_MAX_TOOL_ROUNDS
+
+    def best_effort_content(self, content: Optional[str] = None) -> str:
+        """Reply to persist when the budget ran out before a final answer"""
+        return content or self.partial_content or BUDGET_EXHAUSTED_REPLY
+
+    def available_tools(self) -> List[Dict[str, Any]]:
+        """Tool definitions minus those whose endpoint circuit breaker is open"""
+        tools = []
+        for tool in self.manifest.tools:
+            binding = self.manifest.functions.get(tool.get("function", {}).get("name"))
+            if binding and binding.base_url and tool_breakers.is_open(binding.base_url):
+                continue
+            tools.append(tool)
+        return tools
+
+    def estimated_tokens(self) -> int:
+        """Upper estimate of the tokens the next model call will consume"""
+        prompt_tokens = self.manifest.schema_tokens + sum(
+            message_tokens(message.get("content"), message.get("tool_calls"), model=self.agent.model)
+            for message in self.messages_history
+        )
+        return prompt_tokens + (self.agent.maxTokens or 0)
+
+    def completion_kwargs(self) -> Dict[str, Any]:
+        """Arguments for `client.chat.completions.create` for the next round"""
+        tools = self.available_tools()
+        kwargs = {
+            "model": self.agent.model,
+            "messages": self.messages_history,
+            "tools": tools if tools else None,
+            "temperature": self.agent.temperature,
+            "timeout": max(MIN_CALL_TIME, self.time_left()),
+        }
+        if self.agent.maxTokens:
+            kwargs["max_tokens"] = self.agent.maxTokens
+        if self.agent.jsonResponse:
+            kwargs["response_format"] = {"type": "json_object"}
+        if tools and self.out_of_tool_rounds():
+            # Tool budget spent: the model has to answer with what it has
+            kwargs["tool_choice"] = "none"
+        return kwargs
+
+
+async def _get_agent_manifest(db: AsyncSession, agent_id: str) -> AgentManifest:
+    """Look up the agent's compiled tool manifest, building it on a cache miss"""
+    manifest = agent_manifest_cache.get(agent_id)
+    if manifest is None:
+        generation = agent_manifest_cache.generation
+        tools = await tool_crud.aget_assigned(db, agent_id=agent_id)
+        manifest = compile_agent_manifest(agent_id, tools)
+        agent_manifest_cache.put(manifest, generation)
+    return manifest
+
+
+async def prepare_chat_turn(
+    db: AsyncSession,
+    *,
+    agent_id: str,
+    user_id: str,
+    message_content: str,
+    conversation_id: Optional[str] = None,
+) -> ChatTurn:
+    """
+    Load the agent, API key(s) and the thread's history for a turn and record the user message.
+
+    Agents with `useKeyPool` spread their calls over every key the owner has
+    for the provider of the agent's own key. Raises HTTPException before any
+    model call if the agent or its key is missing.
+    """
+    # Get agent details
+    agent = await agent_crud.aget(db, id=agent_id, user_id=user_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    # Get API key for the agent
+    api_key_obj = None
+    if agent.apiKeyId:
+        api_key_obj = await api_key_crud.aget(db, id=agent.apiKeyId)
+
+    if not api_key_obj or not api_key_obj.key:
+        raise HTTPException(status_code=400, detail="No API key configured for this agent")
+
+    api_keys = [api_key_obj]
+    if agent.useKeyPool:
+        pool = await api_key_crud.aget_by_provider(db, provider=api_key_obj.provider, user_id=api_key_obj.user_id)
+        api_keys += [key for key in pool if key.key and key.id != api_key_obj.id]
+
+    manifest = await _get_agent_manifest(db, agent_id)
+
+    system_messages = []
+    # Add system message with agent instructions at the beginning
+    if agent.roleInstructions:
+        system_messages.append({"role": "system", "content": agent.roleInstructions})
+    # JSON mode is rejected unless the prompt itself asks for JSON
+    if agent.jsonResponse and "json" not in (agent.roleInstructions or "").lower():
+        system_messages.append({"role": "system", "content": "Respond with a JSON object."})
+    user_message_tokens = message_tokens(message_content, model=agent.model)
+
+    # Fill whatever the prompt has left with the most recent history
+    reserved_tokens = manifest.schema_tokens + user_message_tokens + sum(
+        message_tokens(message["content"], model=agent.model) for message in system_messages
+    )
+    history = await message_crud.aget_chat_history(
+        db,
+        agent_id=agent_id,
+        user_id=user_id,
+        token_budget=history_token_budget(agent.model, agent.maxTokens, reserved_tokens),
+        max_messages=settings.CHAT_HISTORY_MAX_MESSAGES,
+        conversation_id=conversation_id
+    )
+    turn = ChatTurn(
+        agent_id=agent_id,
+        user_id=user_id,
+        agent=agent,
+        api_keys=api_keys,
+        messages_history=system_messages + history,
+        manifest=manifest,
+        conversation_id=conversation_id,
+    )
+    turn.add_message({"role": "user", "content": message_content}, token_count=user_message_tokens)
+    return turn
+
+
+def _rate_limited(message: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=message,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+async def _call_model(
+    turn: ChatTurn,
+    api_key: ApiKey,
+    estimated: int,
+    kwargs: Dict[str, Any],
+    max_wait: Optional[float] = None,
+) -> Any:
+    """One model call on one key: admission control, the request itself and health accounting"""
+    await llm_rate_limiter.acquire(
+        api_key.id,
+        estimated,
+        rpm=getattr(api_key, "rpm_limit", None),
+        tpm=getattr(api_key, "tpm_limit", None),
+        max_wait=turn.time_left() - MIN_CALL_TIME if max_wait is None else max_wait,
+    )
+    # Reuse the warm OpenAI client for this key
+    client = llm_client_registry.get(api_key.id, api_key.key)
+    started = time.monotonic()
+    try:
+        response = await client.chat.completions.create(**turn.completion_kwargs(), **kwargs)
+    except RateLimitError as e:
+        # Clients are built without SDK retries, so every provider 429 pauses the key here
+        key_balancer.record(api_key.id, time.monotonic() - started, ok=False)
+        llm_rate_limiter.penalize(api_key.id, retry_after_seconds(e.response.headers))
+        raise
+    except asyncio.CancelledError:
+        # A hedge that lost: its elapsed time is only a lower bound, so it is not
+        # recorded; as a success it would make the slower key look faster.
+        # Its prompt already reached the provider, but the completion tokens
+        # it reserved will not be generated, so they go back to the key's TPM
+        llm_rate_limiter.settle(api_key.id, estimated, estimated - (turn.agent.maxTokens or 0))
+        raise
+    except Exception:
+        key_balancer.record(api_key.id, time.monotonic() - started, ok=False)
+        raise
+    key_balancer.record(api_key.id, time.monotonic() - started, ok=True)
+
+    if kwargs.get("stream"):
+        # Usage only arrives with the last chunk; stream_chat_turn settles it
+        turn.stream_reservation = (api_key.id, estimated)
+        return response
+    usage = getattr(response, "usage", None)
+    llm_rate_limiter.settle(api_key.id, estimated, usage.total_tokens if usage else None)
+    return response
+
+
+async def _hedged_call(turn: ChatTurn, api_key: ApiKey, estimated: int, kwargs: Dict[str, Any]) -> Any:
+    """
+    Call the model on `api_key` and, if it is slower than the key's rolling
+    p95, race a second call on another key from the pool. The first
+    successful response wins and the other call is cancelled.
+    """
+    primary = asyncio.ensure_future(_call_model(turn, api_key, estimated, kwargs))
+    delay = key_balancer.hedge_delay(api_key.id)
+    backup_key = key_balancer.choose(turn.api_keys, exclude={api_key.id}) if delay is not None else None
+    if backup_key is None:
+        return await primary
+
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+
+        # Never queue the hedge: it only helps if it can go out right away
+        backup = asyncio.ensure_future(_call_model(turn, backup_key, estimated, kwargs, max_wait=0))
+        pending.add(backup)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    key_balancer.record_hedge(backup_key.id if task is backup else api_key.id, task is backup)
+                    return task.result()
+                if task is primary or error is None:
+                    error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _create_completion(turn: ChatTurn, **kwargs: Any) -> Any:
+    """
+    Call the model on the healthiest key of the turn once admission control lets it through.
+
+    Provider 429s pause the key for their Retry-After and the call is retried,
+    on another key when the agent has a pool; if it still cannot go out, the
+    client gets a 429 with Retry-After. Agents with `hedgeRequests` hedge
+    non-streamed calls across their pool.
+    """
+    estimated = turn.estimated_tokens()
+    hedge = turn.agent.hedgeRequests and len(turn.api_keys) > 1 and not kwargs.get("stream")
+    retry_after = 1.0
+    started = time.monotonic()
+    try:
+        for _ in range(MAX_RATE_LIMIT_RETRIES + 1):
+            api_key = key_balancer.choose(turn.api_keys)
+            try:
+                if hedge:
+                    response = await _hedged_call(turn, api_key, estimated, kwargs)
+                else:
+                    response = await _call_model(turn, api_key, estimated, kwargs)
+            except RateLimitExceeded as e:
+                raise _rate_limited("Rate limit for this agent's API key exceeded, try again later", e.retry_after)
+            except RateLimitError as e:
+                retry_after = retry_after_seconds(e.response.headers)
+                continue
+            turn.record_usage(getattr(response, "usage", None))
+            return response
+    finally:
+        turn.llm_seconds += time.monotonic() - started
+
+    raise _rate_limited("The model provider is rate limiting this agent's API key, try again later", retry_after)
+
+
+async def _persist_turn(db: AsyncSession, turn: ChatTurn, content: str) -> Message:
+    """Record the final answer with the turn's usage and write the messages and aggregates in one transaction"""
+    accounting = {
+        "prompt_tokens": turn.prompt_tokens,
+        "completion_tokens": turn.completion_tokens,
+        "cached_tokens": turn.cached_tokens,
+        "llm_latency_ms": round(turn.llm_seconds * 1000),
+        "tool_latency_ms": round(turn.tool_seconds * 1000),
+    }
+    turn.add_message({"role": "assistant", "content": content}, **accounting)
+    messages = await message_crud.acreate_many(db, objs_in=turn.pending_messages, commit=False)
+    # Last, so the shared daily row is locked only for the commit itself
+    await usage_crud.aaccumulate(
+        db,
+        agent_id=turn.agent_id,
+        user_id=turn.user_id,
+        day=turn.pending_messages[-1].created_at.date(),
+        **accounting
+    )
+    await db.commit()
+    return messages[-1]
+
+
+async def _persist_user_message(db: AsyncSession, turn: ChatTurn) -> None:
+    """Keep the user's message of a failed turn, so it is not dropped from the thread's history"""
+    try:
+        await db.rollback()
+        await message_crud.acreate_many(db, objs_in=turn.pending_messages[:1])
+    except Exception:
+        traceback.print_exc()
+
+
+async def run_chat_turn(
+    db: AsyncSession,
+    *,
+    agent_id: str,
+    user_id: str,
+    message_content: str,
+    conversation_id: Optional[str] = None,
+) -> ChatResponse:
+    """
+    Run one chat turn against an agent without blocking the event loop.
+
+    The LLM round trips, tool calls and message reads/writes are all awaited,
+    so a single worker can keep many conversations in flight. The turn is
+    bounded by CHAT_MAX_TOOL_ROUNDS and CHAT_TURN_TIMEOUT; when either runs
+    out the best answer produced so far is returned. If the turn fails, the
+    user's message is still stored before the error is raised.
+    """
+    turn = await prepare_chat_turn(
+        db, agent_id=agent_id, user_id=user_id, message_content=message_content, conversation_id=conversation_id
+    )
+
+    try:
+        content: Optional[str] = None
+        while content is None:
+            if turn.out_of_time():
+                content = turn.best_effort_content()
+                break
+
+            # Call OpenAI API
+            try:
+                response = await _create_completion(turn)
+            except APITimeoutError:
+                if not turn.out_of_time():
+                    raise
+                content = turn.best_effort_content()
+                break
+
+            msg = response.choices[0].message
+
+            # Natural language final response
+            if not msg.tool_calls:
+                content = msg.content or ""
+            elif turn.out_of_tool_rounds():
+                # The model asked for tools after its tool budget was spent
+                content = turn.best_effort_content(msg.content)
+            else:
+                tool_calls = [tool_call.model_dump(exclude_none=True) for tool_call in msg.tool_calls]
+                tools_started = time.monotonic()
+                results = await _run_tool_calls(tool_calls, turn.manifest, turn.tool_failures, turn.deadline)
+                turn.tool_seconds += time.monotonic() - tools_started
+                turn.add_tool_round(msg.content, tool_calls, results)
+
+        assistant_message_db = await _persist_turn(db, turn, content)
+        return ChatResponse(
+            message_id=assistant_message_db.id,
+            content=content,
+            role="assistant",
+            tool_calls=turn.tool_calls or None,
+            created_at=assistant_message_db.created_at
+        )
+
+    except HTTPException:
+        await _persist_user_message(db, turn)
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        await _persist_user_message(db, turn)
+        raise HTTPException(status_code=500, detail=f"Error calling OpenAI API: {str(e)}")
+
+
+async def stream_chat_turn(turn: ChatTurn) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run a prepared chat turn with streamed completions, yielding progress events.
+
+    Events are dicts with a `type` of `token`, `tool_call_started`,
+    `tool_call_finished`, `done` or `error`. The messages of the turn are
+    persisted before the `done` event is yielded, and the user's message
+    before an `error` event. Budgets are enforced as in
+    `run_chat_turn`; a reply cut off by the deadline is finished with the
+    text streamed so far.
+    """
+    try:
+        while True:
+            timed_out = turn.out_of_time()
+            content_parts = []
+            streamed_tool_calls: Dict[int, Dict[str, Any]] = {}
+            stream = None
+            if not timed_out:
+                try:
+                    stream = await _create_completion(turn, stream=True, stream_options={"include_usage": True})
+                except APITimeoutError:
+                    if not turn.out_of_time():
+                        raise
+                    timed_out = True
+
+            if stream is not None:
+                stream_started = time.monotonic()
+                async for chunk in stream:
+                    if turn.out_of_time():
+                        timed_out = True
+                        await stream.close()
+                        break
+                    # With include_usage the last chunk carries the usage and no choices
+                    usage = getattr(chunk, "usage", None)
+                    turn.record_usage(usage)
+                    if usage and turn.stream_reservation:
+                        api_key_id, estimated = turn.stream_reservation
+                        llm_rate_limiter.settle(api_key_id, estimated, usage.total_tokens)
+                        turn.stream_reservation = None
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        content_parts.append(delta.content)
+                        yield {"type": "token", "content": delta.content}
+                    # Tool call names and arguments arrive in fragments keyed by index
+                    for tool_call_delta in delta.tool_calls or []:
+                        entry = streamed_tool_calls.setdefault(tool_call_delta.index, {
+                            "id": None,
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""},
+                        })
+                        if tool_call_delta.id:
+                            entry["id"] = tool_call_delta.id
+                        if tool_call_delta.function:
+                            if tool_call_delta.function.name:
+                                entry["function"]["name"] += tool_call_delta.function.name
+                            if tool_call_delta.function.arguments:
+                                entry["function"]["arguments"] += tool_call_delta.function.arguments
+                turn.llm_seconds += time.monotonic() - stream_started
+
+            content = "".join(content_parts)
+
+            if timed_out or (streamed_tool_calls and turn.out_of_tool_rounds()):
+                content = turn.best_effort_content(content)
+                streamed_tool_calls = {}
+
+            # Natural language final response
+            if not streamed_tool_calls:
+                async with AsyncSessionLocal() as db:
+                    assistant_message_db = await _persist_turn(db, turn, content)
+                yield {
+                    "type": "done",
+                    "message_id": assistant_message_db.id,
+                    "content": content,
+                    "tool_calls": turn.tool_calls or None,
+                    "created_at": assistant_message_db.created_at.isoformat(),
+                }
+                return
+
+            tool_calls = [streamed_tool_calls[index] for index in sorted(streamed_tool_calls)]
+
+            for tool_call in tool_calls:
+                yield {"type": "tool_call_started", "tool_call_id": tool_call["id"], "name": tool_call["function"]["name"]}
+
+            tools_started = time.monotonic()
+            tasks = _start_tool_calls(tool_calls, turn.manifest, turn.tool_failures, turn.deadline)
+            names = {tool_call["id"]: tool_call["function"]["name"] for tool_call in tool_calls}
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    result = await finished
+                    yield {
+                        "type": "tool_call_finished",
+                        "tool_call_id": result["tool_call_id"],
+                        "name": names.get(result["tool_call_id"]),
+                    }
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+            turn.tool_seconds += time.monotonic() - tools_started
+            turn.add_tool_round(content, tool_calls, [task.result() for task in tasks])
+
+    except HTTPException as e:
+        async with AsyncSessionLocal() as db:
+            await _persist_user_message(db, turn)
+        yield {"type": "error", "detail": e.detail}
+    except Exception as e:
+        traceback.print_exc()
+        async with AsyncSessionLocal() as db:
+            await _persist_user_message(db, turn)
+        yield {"type": "error", "detail": f"Error calling OpenAI API: {str(e)}"}
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def endpoint_key(base_url: str) -> str:
+    return base_url.rstrip('/')
+
+
+class CircuitBreaker:
+    """
+    Failure tracker for one tool endpoint.
+
+    Opens after `failure_threshold` consecutive endpoint failures and fails
+    fast while open. After `reset_timeout` seconds, or once a background
+    probe reaches the endpoint, it lets a single trial call through
+    (half-open); that call closes or re-opens the breaker.
+    """
+
+    __slots__ = ("state", "failures", "opened_at", "trial_in_flight", "last_error")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.last_error: Optional[str] = None
+
+
+class CircuitBreakerRegistry:
+    """Bounded, LRU-evicted set of circuit breakers keyed by tool base URL"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_endpoints: int):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_endpoints = max(1, max_endpoints)
+        self._breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker()
+            while len(self._breakers) > self.max_endpoints:
+                self._breakers.popitem(last=False)
+        else:
+            self._breakers.move_to_end(key)
+        return breaker
+
+    def allow(self, base_url: str) -> bool:
+        """Whether a call to the endpoint may go out now"""
+        with self._lock:
+            breaker = self._get(endpoint_key(base_url))
+            if breaker.state == OPEN and time.monotonic() - breaker.opened_at >= self.reset_timeout:
+                breaker.state = HALF_OPEN
+            if breaker.state == CLOSED:
+                return True
+            if breaker.state == HALF_OPEN and not breaker.trial_in_flight:
+                breaker.trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self, base_url: str) -> bool:
+        """True while the endpoint is known to be down; does not create state"""
+        breaker = self._breakers.get(endpoint_key(base_url))
+        return bool(breaker and breaker.state == OPEN and time.monotonic() - breaker.opened_at < self.reset_timeout)
+
+    def record_success(self, base_url: str) -> None:
+        with self._lock:
+            breaker = self._get(endpoint_key(base_url))
+            breaker.state = CLOSED
+            breaker.failures = 0
+            breaker.trial_in_flight = False
+            breaker.last_error = None
+
+    def record_failure(self, base_url: str, error: str) -> None:
+        with self._lock:
+            breaker = self._get(endpoint_key(base_url))
+            breaker.failures += 1
+            breaker.trial_in_flight = False
+            breaker.last_error = error
+            if breaker.state == HALF_OPEN or breaker.failures >= self.failure_threshold:
+                breaker.state = OPEN
+                breaker.opened_at = time.monotonic()
+
+    def release(self, base_url: str) -> None:
+        """Give back a half-open trial slot when the call ended without a verdict"""
+        with self._lock:
+            breaker = self._breakers.get(endpoint_key(base_url))
+            if breaker:
+                breaker.trial_in_flight = False
+
+    def _mark_reachable(self, key: str) -> None:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker and breaker.state == OPEN:
+                breaker.state = HALF_OPEN
+                breaker.trial_in_flight = False
+
+    async def probe_open_endpoints(self, timeout: float = 5.0) -> None:
+        """Probe every open endpoint; reachable ones move to half-open"""
+        with self._lock:
+            keys: List[str] = [key for key, breaker in self._breakers.items() if breaker.state == OPEN]
+        if not keys:
+            return
+
+        async def _probe(client: httpx.AsyncClient, key: str) -> None:
+            try:
+                # Any HTTP answer below 500 means the service is up again
+                response = await client.get(key)
+                if response.status_code < 500:
+                    self._mark_reachable(key)
+            except httpx.HTTPError:
+                pass
+
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            await asyncio.gather(*(_probe(client, key) for key in keys))
+
+    async def run_health_probes(self, interval: float) -> None:
+        """Background loop probing open endpoints every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.probe_open_endpoints()
+            except Exception as e:
+                print(f"Tool endpoint health probe failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {
+                key: {"state": breaker.state, "failures": breaker.failures, "last_error": breaker.last_error}
+                for key, breaker in self._breakers.items()
+                if breaker.state != CLOSED or breaker.failures
+            }
+            return {
+                "tracked": len(self._breakers),
+                "max_endpoints": self.max_endpoints,
+                "open": sum(1 for breaker in self._breakers.values() if breaker.state == OPEN),
+                "rejected": self.rejected,
+                "endpoints": endpoints,
+            }
+
+
+tool_breakers = CircuitBreakerRegistry(
+    failure_threshold=settings.TOOL_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.TOOL_BREAKER_RESET_TIMEOUT,
+    max_endpoints=settings.TOOL_BREAKER_MAX_ENDPOINTS,
+)
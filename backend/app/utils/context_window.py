@@ -0,0 +1,79 @@
+import json
+from functools import lru_cache
+from typing import Any, Optional
+
+from app.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to a character heuristic
+    tiktoken = None
+
+# Per-message framing tokens added by the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Context window sizes by model name prefix, longest prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4.1": 1047576,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3": 200000,
+    "o4": 200000,
+}
+DEFAULT_CONTEXT_WINDOW = 16384
+
+
+@lru_cache(maxsize=32)
+def _encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+    except KeyError:
+        return _encoding(None) if model else None
+    except Exception:
+        # Encodings are downloaded on first use and may be unavailable offline
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens in text, estimating ~4 characters per token without tiktoken"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(content: Optional[str], tool_calls: Any = None, model: Optional[str] = None) -> int:
+    """Tokens one stored message contributes to a prompt"""
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(content or "", model)
+    if tool_calls:
+        tokens += count_tokens(json.dumps(tool_calls), model)
+    return tokens
+
+
+def context_window(model: Optional[str]) -> int:
+    """Context window of a model, matched by the longest known name prefix"""
+    model = model or ""
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def history_token_budget(model: Optional[str], max_tokens: Optional[int], reserved_tokens: int) -> int:
+    """
+    Tokens available for prior conversation in the next prompt.
+
+    The model's context window minus the agent's output allowance and the
+    tokens already committed to the system prompt, tool schemas and the new
+    user message, capped at CHAT_HISTORY_TOKEN_BUDGET.
+    """
+    available = context_window(model) - (max_tokens or 0) - reserved_tokens
+    return max(0, min(available, settings.CHAT_HISTORY_TOKEN_BUDGET))
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class IntegrationRoute:
+    """What a Twilio webhook needs from a WhatsAppIntegration: signature secret and routing"""
+    id: str
+    agent_id: str
+    user_id: str
+    enabled: bool
+    twilio_auth_token: Optional[str]
+    twilio_account_sid: Optional[str]
+    twilio_phone_number: Optional[str]
+
+    @classmethod
+    def from_model(cls, integration: Any) -> "IntegrationRoute":
+        return cls(
+            id=integration.id,
+            agent_id=integration.agent_id,
+            user_id=integration.user_id,
+            enabled=bool(integration.enabled),
+            twilio_auth_token=integration.twilio_auth_token,
+            twilio_account_sid=integration.twilio_account_sid,
+            twilio_phone_number=integration.twilio_phone_number,
+        )
+
+
+class IntegrationCache:
+    """
+    In-memory `path_token` -> IntegrationRoute cache for webhook calls.
+
+    Unknown tokens are remembered for `unknown_ttl` seconds in a separate,
+    smaller LRU, so bursts against a bad URL do not reach the database and
+    random tokens cannot push real integrations out. Entries are dropped
+    when an integration is created, updated or deleted; invalidation is per
+    process, so entries also expire after `ttl` seconds when several
+    workers run side by side.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, unknown_ttl: float, max_unknown: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.unknown_ttl = unknown_ttl
+        self.max_unknown = max(1, max_unknown)
+        self._entries: "OrderedDict[str, Tuple[float, IntegrationRoute]]" = OrderedDict()
+        self._unknown: "OrderedDict[str, float]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        """Read before loading an integration and pass to `put` to detect concurrent invalidation"""
+        return self._generation
+
+    def get(self, path_token: str) -> Tuple[bool, Optional[IntegrationRoute]]:
+        """Return `(hit, route)`; a hit with route None means no such integration"""
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(path_token)
+            if entry and entry[0] <= now:
+                del self._entries[path_token]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(path_token)
+                self.hits += 1
+                return True, entry[1]
+            expires_at = self._unknown.get(path_token)
+            if expires_at is not None and expires_at > now:
+                self.hits += 1
+                return True, None
+            self._unknown.pop(path_token, None)
+            self.misses += 1
+            return False, None
+
+    def put(self, path_token: str, route: Optional[IntegrationRoute], generation: int) -> None:
+        with self._lock:
+            # An integration changed while this one was being loaded
+            if generation != self._generation:
+                return
+            if route is None:
+                self._store(self._unknown, path_token, time.monotonic() + self.unknown_ttl, self.max_unknown)
+            else:
+                self._unknown.pop(path_token, None)
+                self._store(self._entries, path_token, (time.monotonic() + self.ttl, route), self.max_entries)
+
+    @staticmethod
+    def _store(entries: OrderedDict, path_token: str, value: Any, max_entries: int) -> None:
+        entries[path_token] = value
+        entries.move_to_end(path_token)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    def invalidate(self, path_token: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(path_token, None)
+            self._unknown.pop(path_token, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "unknown": len(self._unknown),
+            "max_unknown": self.max_unknown,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+whatsapp_integration_cache = IntegrationCache(
+    ttl=settings.WHATSAPP_INTEGRATION_CACHE_TTL,
+    max_entries=settings.WHATSAPP_INTEGRATION_CACHE_SIZE,
+    unknown_ttl=settings.WHATSAPP_INTEGRATION_MISS_CACHE_TTL,
+    max_unknown=settings.WHATSAPP_INTEGRATION_MISS_CACHE_SIZE,
+)
@@ -0,0 +1,128 @@
+import random
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Collection, Dict, Optional, Sequence, TypeVar
+
+from app.config import settings
+
+KeyT = TypeVar("KeyT")
+
+# Smoothing factors for the moving averages of latency and error rate
+LATENCY_ALPHA = 0.2
+ERROR_ALPHA = 0.1
+
+# Floor for key scores when weighting; unmeasured keys get the largest weight
+MIN_SCORE = 0.001
+
+
+class _KeyHealth:
+    __slots__ = ("latency", "error_rate", "samples", "requests", "errors", "hedges_won")
+
+    def __init__(self, window: int):
+        self.latency: Optional[float] = None  # Moving average of successful call latency, seconds
+        self.error_rate = 0.0
+        self.samples: deque = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.hedges_won = 0
+
+    def score(self) -> float:
+        """Lower is better; keys without data score 0 so they get tried"""
+        if self.latency is None:
+            return 0.0
+        return self.latency / max(0.05, 1.0 - self.error_rate)
+
+    def p95(self) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class KeyBalancer:
+    """
+    Spreads model calls over a pool of API keys by observed health.
+
+    Each key keeps a moving average of its latency and error rate plus a
+    rolling window of recent latencies. `choose` picks at random, weighted
+    by inverse score, so load follows the healthiest keys without every
+    turn piling onto the same one. The rolling p95 tells hedged calls when
+    a request has become a tail-latency outlier.
+    """
+
+    def __init__(self, window: int, min_samples: int, max_keys: int = 4096):
+        self.window = max(1, window)
+        self.min_samples = max(1, min_samples)
+        self.max_keys = max(1, max_keys)
+        self._health: "OrderedDict[str, _KeyHealth]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hedges = 0
+
+    def _get(self, api_key_id: str) -> _KeyHealth:
+        health = self._health.get(api_key_id)
+        if health is None:
+            health = self._health[api_key_id] = _KeyHealth(self.window)
+            while len(self._health) > self.max_keys:
+                self._health.popitem(last=False)
+        else:
+            self._health.move_to_end(api_key_id)
+        return health
+
+    def choose(self, keys: Sequence[KeyT], exclude: Collection[str] = ()) -> Optional[KeyT]:
+        """Pick a key (objects with an `id`) from the pool, skipping ids in `exclude`"""
+        candidates = [key for key in keys if key.id not in exclude]
+        if len(candidates) <= 1:
+            return candidates[0] if candidates else None
+        with self._lock:
+            weights = [1.0 / max(MIN_SCORE, self._get(key.id).score()) for key in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+    def record(self, api_key_id: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            health = self._get(api_key_id)
+            health.requests += 1
+            health.error_rate += ERROR_ALPHA * ((0.0 if ok else 1.0) - health.error_rate)
+            if not ok:
+                health.errors += 1
+                return
+            health.samples.append(latency)
+            if health.latency is None:
+                health.latency = latency
+            else:
+                health.latency += LATENCY_ALPHA * (latency - health.latency)
+
+    def hedge_delay(self, api_key_id: str) -> Optional[float]:
+        """Rolling p95 latency of a key, or None until enough calls were observed"""
+        with self._lock:
+            health = self._health.get(api_key_id)
+            if health is None or len(health.samples) < self.min_samples:
+                return None
+            return health.p95()
+
+    def record_hedge(self, winner_id: str, hedge_won: bool) -> None:
+        with self._lock:
+            self.hedges += 1
+            if hedge_won:
+                self._get(winner_id).hedges_won += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked": len(self._health),
+                "hedges": self.hedges,
+                "keys": {
+                    api_key_id: {
+                        "requests": health.requests,
+                        "errors": health.errors,
+                        "error_rate": health.error_rate,
+                        "avg_latency": health.latency,
+                        "p95_latency": health.p95() if health.samples else None,
+                        "hedges_won": health.hedges_won,
+                    }
+                    for api_key_id, health in self._health.items()
+                },
+            }
+
+
+key_balancer = KeyBalancer(
+    window=settings.LLM_KEY_LATENCY_WINDOW,
+    min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+)
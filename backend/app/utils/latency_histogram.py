@@ -0,0 +1,44 @@
+import bisect
+from typing import Iterable, List, Optional
+
+# Upper bounds (ms) of the latency buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [
+    50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000,
+    5000, 7500, 10000, 15000, 20000, 30000, 45000, 60000, 120000,
+]
+
+
+def empty_histogram() -> List[int]:
+    return [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+
+def observe(histogram: Optional[List[int]], latency_ms: float) -> List[int]:
+    """Return a copy of `histogram` with one more observation"""
+    counts = list(histogram) if histogram else empty_histogram()
+    counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+    return counts
+
+
+def merge(histograms: Iterable[Optional[List[int]]]) -> List[int]:
+    counts = empty_histogram()
+    for histogram in histograms:
+        for i, count in enumerate(histogram or ()):
+            counts[i] += count
+    return counts
+
+
+def percentile(histogram: Optional[List[int]], q: float) -> Optional[int]:
+    """
+    Estimate the q-th percentile (0-100) in ms as the upper bound of the
+    bucket it falls in; observations past the last bound report that bound.
+    """
+    total = sum(histogram or ())
+    if not total:
+        return None
+    rank = total * q / 100.0
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= rank and count:
+            return LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)]
+    return LATENCY_BUCKETS_MS[-1]
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+from sqlalchemy import func, select
+
+from app.config import settings
+
+
+def _fingerprint(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class _ClientEntry:
+    __slots__ = ("client", "fingerprint", "last_used")
+
+    def __init__(self, client: AsyncOpenAI, fingerprint: str):
+        self.client = client
+        self.fingerprint = fingerprint
+        self.last_used = time.monotonic()
+
+
+class LLMClientRegistry:
+    """
+    Process-wide cache of AsyncOpenAI clients keyed by `ApiKey.id`.
+
+    Each client owns a keep-alive connection pool, so reusing it across chat
+    turns skips the TCP/TLS handshake with the provider. Entries are evicted
+    least-recently-used once `max_size` is reached, after `idle_ttl` seconds
+    without use, or when the stored key for an id changes (rotation).
+    Evicted clients are closed after `close_grace` seconds so requests still
+    using them can finish.
+    """
+
+    def __init__(self, max_size: int, idle_ttl: float, close_grace: float):
+        self.max_size = max(1, max_size)
+        self.idle_ttl = idle_ttl
+        self.close_grace = close_grace
+        self._clients: "OrderedDict[str, _ClientEntry]" = OrderedDict()
+        self._retired: List[Tuple[float, AsyncOpenAI]] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key_id: str, key: str) -> AsyncOpenAI:
+        """Return a warm client for the key, creating one on a miss"""
+        fingerprint = _fingerprint(key)
+        with self._lock:
+            self._evict_idle()
+            entry = self._clients.get(api_key_id)
+            if entry and entry.fingerprint == fingerprint:
+                self.hits += 1
+                entry.last_used = time.monotonic()
+                self._clients.move_to_end(api_key_id)
+                client = entry.client
+            else:
+                self.misses += 1
+                if entry:
+                    # The key was rotated under the same id
+                    self._retire(api_key_id)
+                # No SDK retries: the turn deadline is the only retry policy, and
+                # provider 429s reach the rate limiter on the first hit
+                client = AsyncOpenAI(api_key=key, max_retries=0)
+                self._clients[api_key_id] = _ClientEntry(client, fingerprint)
+                while len(self._clients) > self.max_size:
+                    self._retire(next(iter(self._clients)))
+        self._close_retired()
+        return client
+
+    def invalidate(self, api_key_id: str) -> None:
+        """Drop the client for a key that was updated or deleted"""
+        with self._lock:
+            if api_key_id in self._clients:
+                self._retire(api_key_id)
+
+    def _retire(self, api_key_id: str) -> None:
+        entry = self._clients.pop(api_key_id)
+        self._retired.append((time.monotonic(), entry.client))
+        self.evictions += 1
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        # Entries are kept in LRU order, so the idle ones are at the front
+        while self._clients:
+            api_key_id, entry = next(iter(self._clients.items()))
+            if now - entry.last_used < self.idle_ttl:
+                break
+            self._retire(api_key_id)
+
+    def _close_retired(self) -> None:
+        """Close retired clients past their grace period; needs a running event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        now = time.monotonic()
+        with self._lock:
+            expired = [client for retired_at, client in self._retired if now - retired_at >= self.close_grace]
+            self._retired = [(retired_at, client) for retired_at, client in self._retired if client not in expired]
+        for client in expired:
+            loop.create_task(client.close())
+
+    async def prewarm(self, limit: Optional[int] = None) -> int:
+        """
+        Open connections for the hottest keys ahead of the first chat turn.
+
+        Keys are ranked by how many agents use them. Returns the number of
+        clients that were warmed successfully.
+        """
+        from app.database import AsyncSessionLocal
+        from app.models.agent import Agent
+        from app.models.api_key import ApiKey
+
+        limit = settings.LLM_CLIENT_PREWARM_KEYS if limit is None else limit
+        if limit <= 0:
+            return 0
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ApiKey.id, ApiKey.key)
+                .join(Agent, Agent.apiKeyId == ApiKey.id)
+                .group_by(ApiKey.id, ApiKey.key)
+                .order_by(func.count(Agent.id).desc())
+                .limit(limit)
+            )
+            keys = result.all()
+
+        async def _warm(api_key_id: str, key: str) -> bool:
+            try:
+                # Any cheap authenticated call establishes the keep-alive connection
+                await asyncio.wait_for(self.get(api_key_id, key).models.list(), timeout=10)
+                return True
+            except Exception as e:
+                print(f"Failed to pre-connect LLM client for API key {api_key_id}: {e}")
+                return False
+
+        warmed = await asyncio.gather(*(_warm(api_key_id, key) for api_key_id, key in keys))
+        return sum(warmed)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._clients),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "pending_close": len(self._retired),
+        }
+
+    async def aclose(self) -> None:
+        """Close every client; used on application shutdown"""
+        with self._lock:
+            clients = [entry.client for entry in self._clients.values()]
+            clients.extend(client for _, client in self._retired)
+            self._clients.clear()
+            self._retired = []
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+
+llm_client_registry = LLMClientRegistry(
+    max_size=settings.LLM_CLIENT_POOL_SIZE,
+    idle_ttl=settings.LLM_CLIENT_IDLE_TTL,
+    close_grace=settings.LLM_CLIENT_CLOSE_GRACE,
+)
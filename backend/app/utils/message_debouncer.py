@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.utils.worker_pool import Job, whatsapp_worker_pool
+
+BatchHandler = Callable[[List[Any]], Awaitable[None]]
+
+
+class _Conversation:
+    __slots__ = ("buffer", "handler", "first_at", "timer", "busy")
+
+    def __init__(self):
+        self.buffer: List[Any] = []
+        self.handler: Optional[BatchHandler] = None
+        self.first_at: Optional[float] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.busy = False
+
+
+class ConversationDebouncer:
+    """
+    Merges messages that arrive in quick succession into one batch per conversation.
+
+    A batch is handed to `submit` once the conversation has been quiet for
+    `window` seconds, or `max_wait` seconds after its first message at the
+    latest. Only one batch per conversation is in flight; messages arriving
+    meanwhile wait for the next batch, so replies go out in order.
+    """
+
+    def __init__(self, *, window: float, max_wait: float, submit: Callable[[Job], bool]):
+        self.window = max(0.0, window)
+        self.max_wait = max(self.window, max_wait)
+        self.submit = submit
+        self._conversations: Dict[str, _Conversation] = {}
+        self.messages = 0
+        self.batches = 0
+        self.batched_messages = 0
+        self.requeued = 0
+
+    def add(self, key: str, item: Any, handler: BatchHandler) -> None:
+        """Buffer `item` for conversation `key`; `handler` receives the batch it ends up in"""
+        conversation = self._conversations.setdefault(key, _Conversation())
+        conversation.buffer.append(item)
+        conversation.handler = handler
+        if conversation.first_at is None:
+            conversation.first_at = time.monotonic()
+        self.messages += 1
+        if not conversation.busy:
+            self._schedule(key, conversation)
+
+    def _schedule(self, key: str, conversation: _Conversation, delay: Optional[float] = None) -> None:
+        if delay is None:
+            # Every new message restarts the quiet period, up to max_wait after the first
+            waited = time.monotonic() - conversation.first_at
+            delay = min(self.window, max(0.0, self.max_wait - waited))
+        if conversation.timer:
+            conversation.timer.cancel()
+        conversation.timer = asyncio.get_running_loop().call_later(delay, self._flush, key)
+
+    def _flush(self, key: str) -> None:
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return
+        conversation.timer = None
+        if conversation.busy or not conversation.buffer:
+            return
+        batch, first_at = conversation.buffer, conversation.first_at
+        conversation.buffer, conversation.first_at = [], None
+        conversation.busy = True
+        handler = conversation.handler
+
+        async def job() -> None:
+            try:
+                await handler(batch)
+            finally:
+                self._done(key)
+
+        if not self.submit(job):
+            # Workers are saturated; keep the batch and try again later
+            conversation.buffer = batch + conversation.buffer
+            conversation.first_at = first_at
+            conversation.busy = False
+            self.requeued += 1
+            self._schedule(key, conversation, delay=max(self.window, 1.0))
+            return
+        self.batches += 1
+        self.batched_messages += len(batch)
+
+    def _done(self, key: str) -> None:
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return
+        conversation.busy = False
+        if conversation.buffer:
+            # Messages that came in while the previous batch was being answered
+            self._schedule(key, conversation)
+        else:
+            del self._conversations[key]
+
+    def flush_all(self) -> None:
+        """Hand on every waiting batch now; used on shutdown before the workers drain"""
+        for key, conversation in list(self._conversations.items()):
+            if conversation.timer:
+                conversation.timer.cancel()
+            self._flush(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "max_wait": self.max_wait,
+            "conversations": len(self._conversations),
+            "waiting_messages": sum(len(conversation.buffer) for conversation in self._conversations.values()),
+            "messages": self.messages,
+            "batches": self.batches,
+            # Agent turns saved by merging
+            "merged_messages": self.batched_messages - self.batches,
+            "requeued": self.requeued,
+        }
+
+
+whatsapp_debouncer = ConversationDebouncer(
+    window=settings.WHATSAPP_DEBOUNCE_WINDOW,
+    max_wait=settings.WHATSAPP_DEBOUNCE_MAX_WAIT,
+    submit=whatsapp_worker_pool.submit,
+)
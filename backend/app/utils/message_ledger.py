@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.crud.whatsapp_message_receipt import wa_message_receipt_crud
+from app.database import AsyncSessionLocal
+
+
+@dataclass(frozen=True)
+class Receipt:
+    status: str  # processing, replied or failed
+    reply_text: Optional[str] = None
+
+
+class MessageLedger:
+    """
+    Idempotency store for inbound messages keyed by provider message ID (Twilio's MessageSid).
+
+    The `whatsapp_message_receipts` table is the source of truth and is
+    shared by all workers; receipts expire after `ttl` seconds and are pruned
+    in the background. A size-bounded LRU in front of it answers most
+    retries without a database round trip.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, Receipt]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.claimed = 0
+        self.duplicates = 0
+        self.cache_hits = 0
+        self.pruned = 0
+
+    def _cached(self, message_sid: str) -> Optional[Receipt]:
+        with self._lock:
+            entry = self._entries.get(message_sid)
+            if entry and entry[0] <= time.monotonic():
+                del self._entries[message_sid]
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(message_sid)
+            return entry[1]
+
+    def _remember(self, message_sid: str, receipt: Receipt) -> None:
+        with self._lock:
+            if receipt.status == "failed":
+                # Let the next delivery go to the database and retry
+                self._entries.pop(message_sid, None)
+                return
+            expires_at = self._entries[message_sid][0] if message_sid in self._entries else time.monotonic() + self.ttl
+            self._entries[message_sid] = (expires_at, receipt)
+            self._entries.move_to_end(message_sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def claim(self, db: AsyncSession, message_sid: str, integration_id: str) -> Tuple[bool, Receipt]:
+        """
+        Returns `(True, receipt)` if this delivery should be processed, or
+        `(False, receipt)` with the earlier delivery's status and reply.
+        """
+        receipt = self._cached(message_sid)
+        if receipt is not None and receipt.status != "failed":
+            self.cache_hits += 1
+            self.duplicates += 1
+            return False, receipt
+
+        claimed, row = await wa_message_receipt_crud.aclaim(
+            db, message_sid=message_sid, integration_id=integration_id, ttl=self.ttl
+        )
+        receipt = Receipt(status=row.status, reply_text=row.reply_text)
+        if claimed:
+            self.claimed += 1
+        else:
+            self.duplicates += 1
+        self._remember(message_sid, receipt)
+        return claimed, receipt
+
+    async def finish(self, message_sids: Iterable[str], status: str, reply_text: Optional[str] = None) -> None:
+        """Record the outcome for every message answered by one reply"""
+        message_sids = [sid for sid in message_sids if sid]
+        if not message_sids:
+            return
+        receipt = Receipt(status=status, reply_text=reply_text)
+        for message_sid in message_sids:
+            self._remember(message_sid, receipt)
+        try:
+            async with AsyncSessionLocal() as db:
+                await wa_message_receipt_crud.afinish(
+                    db, message_sids=message_sids, status=status, reply_text=reply_text
+                )
+        except Exception as e:
+            print(f"Failed to record outcome of WhatsApp messages {message_sids}: {e}")
+
+    async def run_pruning(self, interval: float) -> None:
+        """Background loop deleting expired receipts every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    self.pruned += await wa_message_receipt_crud.aprune(db)
+            except Exception as e:
+                print(f"WhatsApp message receipt pruning failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "cached": len(self._entries),
+            "max_entries": self.max_entries,
+            "claimed": self.claimed,
+            "duplicates": self.duplicates,
+            "cache_hits": self.cache_hits,
+            "pruned": self.pruned,
+        }
+
+
+whatsapp_message_ledger = MessageLedger(
+    ttl=settings.WHATSAPP_RECEIPT_TTL,
+    max_entries=settings.WHATSAPP_RECEIPT_CACHE_SIZE,
+)
@@ -0,0 +1,281 @@
+import asyncio
+import math
+import random
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.crud.whatsapp_dead_letter import wa_dead_letter_crud
+from app.database import AsyncSessionLocal
+from app.utils.twilio_messages import TwilioMessagesClient, TwilioSendError, split_body, twilio_messages
+
+DoneCallback = Callable[[bool], Awaitable[None]]
+
+
+class _Pacer:
+    """Token bucket refilled at `rate` per second, holding at most `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(0.01, rate)
+        self.burst = max(1, burst)
+        self.level = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Wait for one token; returns the seconds spent waiting"""
+        started = time.monotonic()
+        # One waiter at a time, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.level = min(self.burst, self.level + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                wait = max(self.blocked_until - now, (1 - self.level) / self.rate if self.level < 1 else 0.0)
+                if wait <= 0:
+                    self.level -= 1
+                    return now - started
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every send on this number, e.g. after Twilio answered 429"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+@dataclass
+class OutboundMessage:
+    """One reply, sent as one or more Twilio-sized parts in order"""
+    account_sid: str
+    auth_token: str
+    from_number: str
+    to_number: str
+    parts: List[str]
+    integration_id: Optional[str] = None
+    on_done: Optional[DoneCallback] = None
+    sent_parts: int = 0
+    attempts: int = 0  # Failed attempts so far
+    status_code: Optional[int] = None
+    last_error: Optional[str] = None
+
+
+class _Lane:
+    __slots__ = ("pacer", "queues", "tasks", "in_flight", "sent", "retried", "dead_lettered", "rejected", "paced", "total_wait")
+
+    def __init__(self, pacer: _Pacer, queues: int, queue_size: int):
+        self.pacer = pacer
+        # One queue per sender; a recipient always hashes to the same one
+        self.queues: "List[asyncio.Queue[OutboundMessage]]" = [asyncio.Queue(maxsize=queue_size) for _ in range(queues)]
+        self.tasks: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.rejected = 0
+        self.paced = 0
+        self.total_wait = 0.0
+
+    def queue_for(self, to_number: str) -> "asyncio.Queue[OutboundMessage]":
+        return self.queues[hash(to_number) % len(self.queues)]
+
+    def queued(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+
+class OutboundMessageQueue:
+    """
+    Paced outbound message queue, one lane per sending number.
+
+    Each lane has a token bucket sized to the number's Twilio throughput
+    and `concurrency` senders sharing the pooled TwilioMessagesClient. Every
+    recipient is served by one sender with its own queue, so replies to the
+    same user, and the parts of each reply, go out in order. Network
+    errors, 429 and 5xx are retried with exponential backoff (a 429 pauses
+    the whole lane for its Retry-After). Replies that still fail, or that
+    Twilio rejects outright, are stored in `whatsapp_dead_letters`.
+    """
+
+    def __init__(
+        self,
+        client: TwilioMessagesClient,
+        *,
+        rate: float,
+        burst: int,
+        concurrency: int,
+        queue_size: int,
+        max_attempts: int,
+        backoff: float,
+        max_backoff: float,
+    ):
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(1, queue_size)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lanes: Dict[str, _Lane] = {}
+
+    def _lane(self, from_number: str) -> _Lane:
+        lane = self._lanes.get(from_number)
+        if lane is None:
+            lane = self._lanes[from_number] = _Lane(
+                _Pacer(self.rate, self.burst), self.concurrency, math.ceil(self.queue_size / self.concurrency)
+            )
+            lane.tasks = [asyncio.create_task(self._work(lane, queue)) for queue in lane.queues]
+        return lane
+
+    async def enqueue(
+        self,
+        *,
+        account_sid: str,
+        auth_token: str,
+        from_number: str,
+        to_number: str,
+        text: str,
+        integration_id: Optional[str] = None,
+        on_done: Optional[DoneCallback] = None,
+    ) -> bool:
+        """
+        Queue `text` for delivery from `from_number`; `on_done(sent)` runs once it
+        is delivered or dead-lettered. Returns False (and dead-letters the
+        reply) if the number's queue is full.
+        """
+        message = OutboundMessage(
+            account_sid=account_sid,
+            auth_token=auth_token,
+            from_number=from_number,
+            to_number=to_number,
+            parts=split_body(text),
+            integration_id=integration_id,
+            on_done=on_done,
+        )
+        lane = self._lane(from_number)
+        try:
+            lane.queue_for(to_number).put_nowait(message)
+        except asyncio.QueueFull:
+            lane.rejected += 1
+            message.last_error = "outbound queue full"
+            await self._finish(lane, message, False)
+            return False
+        return True
+
+    async def _work(self, lane: _Lane, queue: "asyncio.Queue[OutboundMessage]") -> None:
+        while True:
+            message = await queue.get()
+            lane.in_flight += 1
+            try:
+                sent = await self._deliver(lane, message)
+            except Exception as e:
+                message.last_error = message.last_error or str(e)
+                print(f"Outbound WhatsApp message from {message.from_number} failed")
+                traceback.print_exc()
+                sent = False
+            try:
+                await self._finish(lane, message, sent)
+            finally:
+                lane.in_flight -= 1
+                queue.task_done()
+
+    async def _deliver(self, lane: _Lane, message: OutboundMessage) -> bool:
+        while message.sent_parts < len(message.parts):
+            lane.total_wait += await lane.pacer.acquire()
+            lane.paced += 1
+            try:
+                await self.client.send(
+                    account_sid=message.account_sid,
+                    auth_token=message.auth_token,
+                    from_number=message.from_number,
+                    to_number=message.to_number,
+                    body=message.parts[message.sent_parts],
+                )
+            except TwilioSendError as e:
+                message.attempts += 1
+                message.status_code = e.status_code
+                message.last_error = str(e)
+                if not e.retryable or message.attempts >= self.max_attempts:
+                    return False
+                lane.retried += 1
+                if e.retry_after:
+                    lane.pacer.pause(e.retry_after)
+                # Jitter keeps retries from many senders apart
+                delay = min(self.max_backoff, self.backoff * 2 ** (message.attempts - 1))
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                continue
+            message.sent_parts += 1
+            lane.sent += 1
+        return True
+
+    async def _finish(self, lane: _Lane, message: OutboundMessage, sent: bool) -> None:
+        if not sent:
+            lane.dead_lettered += 1
+            print(f"Dead-lettering WhatsApp reply to {message.to_number}: {message.last_error}")
+            try:
+                async with AsyncSessionLocal() as db:
+                    await wa_dead_letter_crud.acreate(
+                        db,
+                        integration_id=message.integration_id,
+                        from_number=message.from_number,
+                        to_number=message.to_number,
+                        body="\n".join(message.parts[message.sent_parts:]),
+                        attempts=message.attempts,
+                        status_code=message.status_code,
+                        last_error=message.last_error,
+                    )
+            except Exception as e:
+                print(f"Failed to store dead letter for {message.to_number}: {e}")
+        if message.on_done:
+            try:
+                await message.on_done(sent)
+            except Exception:
+                traceback.print_exc()
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Give queued replies up to `timeout` seconds to go out, then cancel the senders"""
+        lanes, self._lanes = list(self._lanes.values()), {}
+        if not lanes:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for lane in lanes for queue in lane.queues)), timeout)
+        except asyncio.TimeoutError:
+            print(f"Dropping {sum(lane.queued() for lane in lanes)} queued WhatsApp message(s) on shutdown")
+        tasks = [task for lane in lanes for task in lane.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        numbers = {
+            from_number: {
+                "queued": lane.queued(),
+                "in_flight": lane.in_flight,
+                "sent": lane.sent,
+                "retried": lane.retried,
+                "dead_lettered": lane.dead_lettered,
+                "rejected": lane.rejected,
+                "avg_pacing_wait": lane.total_wait / lane.paced if lane.paced else 0.0,
+            }
+            for from_number, lane in self._lanes.items()
+        }
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "concurrency": self.concurrency,
+            "queued": sum(number["queued"] for number in numbers.values()),
+            "numbers": numbers,
+        }
+
+
+whatsapp_outbound = OutboundMessageQueue(
+    twilio_messages,
+    rate=settings.WHATSAPP_SEND_RATE,
+    burst=settings.WHATSAPP_SEND_BURST,
+    concurrency=settings.WHATSAPP_SEND_CONCURRENCY,
+    queue_size=settings.WHATSAPP_SEND_QUEUE_SIZE,
+    max_attempts=settings.WHATSAPP_SEND_MAX_ATTEMPTS,
+    backoff=settings.WHATSAPP_SEND_BACKOFF,
+    max_backoff=settings.WHATSAPP_SEND_MAX_BACKOFF,
+)
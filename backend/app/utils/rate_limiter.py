@@ -0,0 +1,231 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot be admitted within the allowed wait"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+    """Bucket refilled continuously at `capacity` per minute"""
+
+    __slots__ = ("capacity", "level", "updated_at")
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def resize(self, capacity: float) -> None:
+        if capacity != self.capacity:
+            self.level = min(self.level, capacity)
+            self.capacity = capacity
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.capacity / 60.0)
+        self.updated_at = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available; assumes `refill` was just called"""
+        # A single request larger than the bucket only needs a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+
+class _KeyLimiter:
+    __slots__ = (
+        "requests", "tokens", "blocked_until", "queued", "max_queued",
+        "admitted", "rejected", "throttled", "total_wait", "max_wait",
+    )
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.queued = 0
+        self.max_queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class ProviderRateLimiter:
+    """
+    Admission control for LLM calls, keyed by `ApiKey.id`.
+
+    Every call takes one request from a requests-per-minute bucket and its
+    estimated tokens from a tokens-per-minute bucket. Calls that do not fit
+    wait in a bounded queue for at most `max_wait` seconds instead of going
+    out and collecting a 429. A 429 from the provider pauses the whole key
+    for its `Retry-After`. Estimates are corrected once the actual usage of
+    a call is known.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_wait: float, max_queue: int, max_keys: int = 1024):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.max_queue = max(0, max_queue)
+        self.max_keys = max(1, max_keys)
+        self._limiters: "OrderedDict[str, _KeyLimiter]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, api_key_id: str, rpm: Optional[int], tpm: Optional[int]) -> _KeyLimiter:
+        rpm = max(1, rpm or self.rpm)
+        tpm = max(1, tpm or self.tpm)
+        limiter = self._limiters.get(api_key_id)
+        if limiter is None:
+            limiter = self._limiters[api_key_id] = _KeyLimiter(rpm, tpm)
+            while len(self._limiters) > self.max_keys:
+                self._limiters.popitem(last=False)
+        else:
+            limiter.requests.resize(rpm)
+            limiter.tokens.resize(tpm)
+            self._limiters.move_to_end(api_key_id)
+        return limiter
+
+    def _try_admit(self, limiter: _KeyLimiter, tokens: int) -> float:
+        """Take capacity and return 0, or return the seconds to wait before retrying"""
+        now = time.monotonic()
+        limiter.requests.refill(now)
+        limiter.tokens.refill(now)
+        wait = max(
+            limiter.blocked_until - now,
+            limiter.requests.wait_for(1),
+            limiter.tokens.wait_for(tokens),
+        )
+        if wait > 0:
+            return wait
+        limiter.requests.level -= 1
+        limiter.tokens.level -= tokens
+        return 0.0
+
+    async def acquire(
+        self,
+        api_key_id: str,
+        tokens: int,
+        *,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        max_wait: Optional[float] = None,
+    ) -> None:
+        """
+        Wait until the key has capacity for one request of `tokens` tokens.
+
+        Raises RateLimitExceeded if the queue for the key is full or the
+        request could not be admitted within `max_wait` seconds (at most the
+        limiter's own `max_wait`).
+        """
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else max(0.0, min(max_wait, self.max_wait)))
+        queued = False
+        try:
+            while True:
+                with self._lock:
+                    limiter = self._get(api_key_id, rpm, tpm)
+                    wait = self._try_admit(limiter, tokens)
+                    now = time.monotonic()
+                    if wait == 0:
+                        waited = now - started
+                        limiter.admitted += 1
+                        limiter.total_wait += waited
+                        limiter.max_wait = max(limiter.max_wait, waited)
+                        return
+                    if not queued and limiter.queued >= self.max_queue:
+                        limiter.rejected += 1
+                        raise RateLimitExceeded(f"Too many requests queued for API key {api_key_id}", wait)
+                    if now + wait > deadline:
+                        limiter.rejected += 1
+                        raise RateLimitExceeded(f"Rate limit for API key {api_key_id} exceeded", wait)
+                    if not queued:
+                        queued = True
+                        limiter.queued += 1
+                        limiter.max_queued = max(limiter.max_queued, limiter.queued)
+                await asyncio.sleep(wait)
+        finally:
+            if queued:
+                with self._lock:
+                    limiter = self._limiters.get(api_key_id)
+                    if limiter:
+                        limiter.queued -= 1
+
+    def settle(self, api_key_id: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Correct the token bucket once a call's actual usage is known"""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            limiter = self._limiters.get(api_key_id)
+            if limiter:
+                limiter.tokens.level = min(
+                    limiter.tokens.capacity,
+                    limiter.tokens.level + estimated_tokens - actual_tokens,
+                )
+
+    def penalize(self, api_key_id: str, retry_after: float) -> None:
+        """Pause all calls for the key after the provider answered 429"""
+        with self._lock:
+            limiter = self._limiters.get(api_key_id)
+            if limiter:
+                limiter.throttled += 1
+                limiter.blocked_until = max(limiter.blocked_until, time.monotonic() + retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = {
+                api_key_id: {
+                    "queue_depth": limiter.queued,
+                    "max_queue_depth": limiter.max_queued,
+                    "admitted": limiter.admitted,
+                    "rejected": limiter.rejected,
+                    "provider_429s": limiter.throttled,
+                    "avg_wait": limiter.total_wait / limiter.admitted if limiter.admitted else 0.0,
+                    "max_wait": limiter.max_wait,
+                    "rpm_limit": limiter.requests.capacity,
+                    "tpm_limit": limiter.tokens.capacity,
+                }
+                for api_key_id, limiter in self._limiters.items()
+            }
+            return {
+                "tracked": len(self._limiters),
+                "queue_depth": sum(key["queue_depth"] for key in keys.values()),
+                "max_wait_allowed": self.max_wait,
+                "max_queue": self.max_queue,
+                "keys": keys,
+            }
+
+
+def retry_after_seconds(headers: Any, default: float = 1.0) -> float:
+    """Read `retry-after-ms` or `retry-after` (seconds) from a 429 response's headers"""
+    if headers is None:
+        return default
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000.0
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            return float(retry_after)
+    except (TypeError, ValueError):
+        pass
+    return default
+
+
+llm_rate_limiter = ProviderRateLimiter(
+    rpm=settings.LLM_RATE_LIMIT_RPM,
+    tpm=settings.LLM_RATE_LIMIT_TPM,
+    max_wait=settings.LLM_RATE_LIMIT_MAX_WAIT,
+    max_queue=settings.LLM_RATE_LIMIT_MAX_QUEUE,
+)
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different request"""
+
+
+def request_fingerprint(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "task", "expires_at")
+
+    def __init__(self, fingerprint: str, task: asyncio.Task):
+        self.fingerprint = fingerprint
+        self.task = task
+        self.expires_at: Optional[float] = None  # Set once the task has succeeded
+
+
+class RequestCoalescer:
+    """
+    Share one execution between identical requests.
+
+    A request whose key matches a running execution awaits that execution
+    instead of starting its own; successful results are then replayed for
+    `ttl` seconds. Failed executions are forgotten at once so a retry runs
+    again. The shared task is shielded from the callers, so a caller that
+    goes away does not cancel it for the others.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.started = 0
+        self.coalesced = 0
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry.expires_at and entry.expires_at <= now]:
+            del self._entries[key]
+        # Over capacity, forget the oldest finished results; running ones stay
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._entries[key].expires_at:
+                del self._entries[key]
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        ttl: float,
+        factory: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Await the execution for `key`, starting it with `factory` if none is live.
+
+        Raises IdempotencyConflict if `key` is live for a different `fingerprint`.
+        """
+        self._prune()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflict(f"Key {key} was already used for a different request")
+            self.coalesced += 1
+        else:
+            entry = self._entries[key] = _Entry(fingerprint, asyncio.ensure_future(factory()))
+            self.started += 1
+
+            def _settle(task: asyncio.Task, key: str = key, entry: _Entry = entry) -> None:
+                if not task.cancelled() and task.exception() is None:
+                    entry.expires_at = time.monotonic() + ttl
+                elif self._entries.get(key) is entry:
+                    del self._entries[key]
+
+            entry.task.add_done_callback(_settle)
+        return await asyncio.shield(entry.task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "in_flight": sum(1 for entry in self._entries.values() if not entry.task.done()),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+chat_coalescer = RequestCoalescer(max_entries=settings.CHAT_COALESCE_MAX_ENTRIES)
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+
+
+def tool_cache_key(tool_id: str, tool_name: str, tool_args: Dict[str, Any]) -> str:
+    """Key a tool result by tool, function name and canonicalised arguments"""
+    canonical_args = json.dumps(tool_args, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256(canonical_args.encode()).hexdigest()
+    return f"{tool_id}:{tool_name}:{digest}"
+
+
+class ToolResultCache:
+    """
+    Size-bounded LRU cache with per-entry TTL for idempotent tool results.
+
+    Only tools flagged `cacheable` are looked up here; hit/miss counters are
+    kept overall and per function name.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._by_tool: Dict[str, Dict[str, int]] = {}
+
+    def get(self, key: str, tool_name: str) -> Tuple[bool, Optional[Any]]:
+        """Return `(hit, result)` for a key"""
+        with self._lock:
+            counters = self._by_tool.setdefault(tool_name, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                counters["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            counters["hits"] += 1
+            return True, entry[1]
+
+    def put(self, key: str, result: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_tool(self, tool_id: str) -> None:
+        """Drop every cached result of a tool, e.g. after its URL, schema or `cacheable` flag changed"""
+        prefix = f"{tool_id}:"
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "by_tool": {
+                name: {
+                    **counters,
+                    "hit_rate": counters["hits"] / (counters["hits"] + counters["misses"])
+                    if counters["hits"] + counters["misses"] else 0.0,
+                }
+                for name, counters in self._by_tool.items()
+            },
+        }
+
+
+tool_result_cache = ToolResultCache(max_entries=settings.TOOL_RESULT_CACHE_SIZE)
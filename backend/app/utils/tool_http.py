@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+
+try:
+    import h2  # noqa: F401  HTTP/2 support for httpx
+except ImportError:  # Tool calls stay on HTTP/1.1
+    h2 = None
+
+
+def origin(base_url: str) -> str:
+    """scheme://host[:port] of a URL; tools on the same origin share connections"""
+    url = httpx.URL(base_url)
+    port = f":{url.port}" if url.port else ""
+    return f"{url.scheme}://{url.host}{port}"
+
+
+class _OriginStats:
+    __slots__ = ("requests", "in_flight", "errors")
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = 0
+
+
+class ToolHTTPClientPool:
+    """
+    Keep-alive httpx clients for tool services, one per origin.
+
+    Each client keeps up to `max_keepalive` idle connections open so repeated
+    tool calls skip the TCP/TLS handshake. At most `max_clients` origins are
+    kept; the least recently used idle client is closed beyond that.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_clients: int,
+        max_connections: int,
+        max_keepalive: int,
+        keepalive_expiry: float,
+        connect_timeout: float,
+        read_timeout: float,
+        http2: bool,
+    ):
+        self.max_clients = max(1, max_clients)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        if http2 and h2 is None:
+            print("TOOL_HTTP2 is set but the h2 package is not installed; tool calls use HTTP/1.1")
+        self.http2 = http2 and h2 is not None
+        self._clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        self._stats: Dict[str, _OriginStats] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+        self.truncated = 0  # Responses cut short at max_bytes
+
+    def timeout(self, total: Optional[float] = None) -> httpx.Timeout:
+        """Request timeout, tightened to `total` seconds when a deadline applies"""
+        read = self.read_timeout if total is None else min(total, self.read_timeout)
+        return httpx.Timeout(read, connect=min(read, self.connect_timeout))
+
+    def _client(self, key: str) -> httpx.AsyncClient:
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+            client = self._clients[key] = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout(),
+                http2=self.http2,
+            )
+            self._stats.setdefault(key, _OriginStats())
+            self.created += 1
+            expired = []
+            for old_key in list(self._clients):
+                if len(self._clients) <= self.max_clients:
+                    break
+                if old_key != key and not self._stats[old_key].in_flight:
+                    expired.append(self._clients.pop(old_key))
+                    self._stats.pop(old_key, None)
+                    self.evictions += 1
+        for old_client in expired:
+            asyncio.get_running_loop().create_task(old_client.aclose())
+        return client
+
+    async def post(
+        self,
+        url: str,
+        *,
+        timeout: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Tuple[httpx.Response, bytes, bool]:
+        """
+        POST through the pooled client for the URL's origin.
+
+        The body is streamed in and reading stops after `max_bytes`, so an
+        oversized answer never sits whole in memory. Returns the response, the
+        body read and whether it was cut short.
+        """
+        key = origin(url)
+        client = self._client(key)
+        stats = self._stats[key]
+        stats.requests += 1
+        stats.in_flight += 1
+        try:
+            async with client.stream("POST", url, timeout=self.timeout(timeout), **kwargs) as response:
+                chunks = []
+                size = 0
+                truncated = False
+                async for chunk in response.aiter_bytes():
+                    if max_bytes is not None and size + len(chunk) > max_bytes:
+                        chunks.append(chunk[:max_bytes - size])
+                        truncated = True
+                        break
+                    chunks.append(chunk)
+                    size += len(chunk)
+                if truncated:
+                    self.truncated += 1
+            return response, b"".join(chunks), truncated
+        except httpx.HTTPError:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "max_clients": self.max_clients,
+                "max_connections_per_origin": self.limits.max_connections,
+                "http2": self.http2,
+                "created": self.created,
+                "evictions": self.evictions,
+                "truncated_responses": self.truncated,
+                "origins": {
+                    key: {"requests": stats.requests, "in_flight": stats.in_flight, "errors": stats.errors}
+                    for key, stats in self._stats.items()
+                },
+            }
+
+    async def aclose(self) -> None:
+        """Close every client; used on application shutdown"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
+tool_http_pool = ToolHTTPClientPool(
+    max_clients=settings.TOOL_HTTP_MAX_CLIENTS,
+    max_connections=settings.TOOL_HTTP_MAX_CONNECTIONS,
+    max_keepalive=settings.TOOL_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=settings.TOOL_HTTP_KEEPALIVE_EXPIRY,
+    connect_timeout=settings.TOOL_HTTP_CONNECT_TIMEOUT,
+    read_timeout=settings.TOOL_HTTP_READ_TIMEOUT,
+    http2=settings.TOOL_HTTP2,
+)
@@ -0,0 +1,198 @@
+import copy
+import json
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Set, Tuple
+
+from jsonschema import SchemaError
+from jsonschema.protocols import Validator
+from jsonschema.validators import validator_for
+
+from app.config import settings
+from app.utils.context_window import count_tokens
+from app.utils.tool_results import ResultPath, compile_result_paths
+
+
+@dataclass(frozen=True)
+class ToolBinding:
+    """How to dispatch one function name exposed by a Tool"""
+    tool_id: str
+    base_url: Optional[str]
+    secret_code: Optional[str]  # Bearer secret for the tool service
+    cache_ttl: Optional[float]  # Result cache TTL in seconds, None if results must not be cached
+    batch: bool = False  # Calls to this tool's service may be sent together as one batch
+    result_paths: Tuple[ResultPath, ...] = ()  # Parsed projection paths, empty to keep whole results
+    result_max_tokens: int = settings.TOOL_RESULT_MAX_TOKENS  # Cap on a result's size in the prompt
+
+
+@dataclass(frozen=True)
+class AgentManifest:
+    """
+    Immutable runtime view of the tools an agent can call.
+
+    Built once from the agent's Tool rows and shared across chat turns; the
+    schema dicts are private copies and must be treated as read-only.
+    """
+    agent_id: str
+    tool_ids: FrozenSet[str]
+    tools: Tuple[Dict[str, Any], ...]  # OpenAI tool definitions
+    functions: Mapping[str, ToolBinding]  # Function name -> dispatch details
+    validators: Mapping[str, Validator]  # Function name -> compiled `parameters` schema
+    schema_tokens: int  # Approximate prompt tokens taken by the tool definitions
+    built_at: float
+
+
+def _schema_tools(function_schema: Any) -> list:
+    """Normalise the three stored functionSchema shapes to a list of tool definitions"""
+    if isinstance(function_schema, dict) and "tools" in function_schema:
+        return function_schema["tools"]
+    if isinstance(function_schema, list):
+        return function_schema
+    if isinstance(function_schema, dict) and function_schema.get("type") == "function":
+        return [function_schema]
+    return []
+
+
+def _cache_ttl(tool: Any) -> Optional[float]:
+    if not getattr(tool, "cacheable", False):
+        return None
+    ttl = getattr(tool, "cacheTtl", None)
+    return float(ttl) if ttl else settings.TOOL_RESULT_CACHE_TTL
+
+
+@lru_cache(maxsize=1024)
+def _compile_validator(schema_json: str) -> Optional[Validator]:
+    """Compile a `parameters` schema once; tools shared by several agents reuse the validator"""
+    schema = json.loads(schema_json)
+    cls = validator_for(schema)
+    try:
+        cls.check_schema(schema)
+    except SchemaError as e:
+        print(f"Tool parameters schema is invalid, arguments will not be validated: {e.message}")
+        return None
+    return cls(schema)
+
+
+def compile_agent_manifest(agent_id: str, tools: Iterable[Any]) -> AgentManifest:
+    """Walk each Tool.functionSchema once and build the agent's manifest"""
+    schemas = []
+    tool_ids = set()
+    functions = {}
+    validators = {}
+    for tool in tools:
+        tool_ids.add(tool.id)
+        binding = ToolBinding(
+            tool_id=tool.id,
+            base_url=tool.baseUrl,
+            secret_code=getattr(tool, "secretCode", None),
+            cache_ttl=_cache_ttl(tool),
+            batch=bool(getattr(tool, "supportsBatch", False)),
+            result_paths=compile_result_paths(getattr(tool, "resultFields", None)),
+            result_max_tokens=getattr(tool, "resultMaxTokens", None) or settings.TOOL_RESULT_MAX_TOKENS,
+        )
+        try:
+            for schema_tool in _schema_tools(tool.functionSchema):
+                schema_tool = copy.deepcopy(schema_tool)
+                if schema_tool.get("type") == "function":
+                    name = schema_tool["function"]["name"]
+                    functions[name] = binding
+                    parameters = schema_tool["function"].get("parameters")
+                    validator = _compile_validator(json.dumps(parameters, sort_keys=True)) if parameters else None
+                    if validator:
+                        validators[name] = validator
+                schemas.append(schema_tool)
+        except (AttributeError, KeyError, TypeError):
+            continue
+    return AgentManifest(
+        agent_id=agent_id,
+        tool_ids=frozenset(tool_ids),
+        tools=tuple(schemas),
+        functions=MappingProxyType(functions),
+        validators=MappingProxyType(validators),
+        schema_tokens=count_tokens(json.dumps(schemas)) if schemas else 0,
+        built_at=time.monotonic(),
+    )
+
+
+class AgentManifestCache:
+    """
+    In-memory cache of compiled agent manifests.
+
+    Entries are dropped when tools are assigned, unassigned, updated or
+    deleted. Invalidation is per process, so entries also expire after `ttl`
+    seconds to bound staleness when several workers run side by side.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._manifests: Dict[str, AgentManifest] = {}
+        self._agents_by_tool: Dict[str, Set[str]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        """Read before building a manifest and pass to `put` to detect concurrent invalidation"""
+        return self._generation
+
+    def get(self, agent_id: str) -> Optional[AgentManifest]:
+        with self._lock:
+            manifest = self._manifests.get(agent_id)
+            if manifest and time.monotonic() - manifest.built_at >= self.ttl:
+                self._drop(agent_id)
+                manifest = None
+            if manifest:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return manifest
+
+    def put(self, manifest: AgentManifest, generation: int) -> None:
+        with self._lock:
+            # Something was invalidated while this manifest was being built
+            if generation != self._generation:
+                return
+            self._drop(manifest.agent_id)
+            self._manifests[manifest.agent_id] = manifest
+            for tool_id in manifest.tool_ids:
+                self._agents_by_tool.setdefault(tool_id, set()).add(manifest.agent_id)
+
+    def invalidate_agent(self, agent_id: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._drop(agent_id)
+
+    def invalidate_tool(self, tool_id: str) -> None:
+        """Drop the manifest of every agent that uses the tool"""
+        with self._lock:
+            self._generation += 1
+            for agent_id in list(self._agents_by_tool.get(tool_id, ())):
+                self._drop(agent_id)
+
+    def _drop(self, agent_id: str) -> None:
+        manifest = self._manifests.pop(agent_id, None)
+        if not manifest:
+            return
+        for tool_id in manifest.tool_ids:
+            agent_ids = self._agents_by_tool.get(tool_id)
+            if agent_ids:
+                agent_ids.discard(agent_id)
+                if not agent_ids:
+                    del self._agents_by_tool[tool_id]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._manifests),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+agent_manifest_cache = AgentManifestCache(ttl=settings.AGENT_MANIFEST_TTL)
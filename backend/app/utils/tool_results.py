@@ -0,0 +1,137 @@
+import json
+import re
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.utils.context_window import count_tokens
+
+PathToken = Union[str, int]  # Object key, list index, or "*" for every element
+ResultPath = Tuple[str, Tuple[PathToken, ...]]  # Original expression and its parsed tokens
+
+_PATH_TOKEN = re.compile(r"\.?([^.\[\]]+)|\[(\*|-?\d+)\]")
+
+# (max list items, max string length) tried in order until a shortened result fits
+_COMPACTION_STEPS = ((50, 2000), (20, 500), (10, 200), (5, 100), (3, 50), (1, 20))
+
+_MISSING = object()
+
+
+def parse_result_path(expression: str) -> Tuple[PathToken, ...]:
+    """
+    Parse a JSON path such as `$.data.items[*].name` or `results[0].id`.
+
+    Supports dotted keys, `[n]` list indexes and `*` / `[*]` wildcards.
+    Raises ValueError on anything else.
+    """
+    path = expression.strip()
+    if path.startswith("$"):
+        path = path[1:]
+    tokens: List[PathToken] = []
+    position = 0
+    while position < len(path):
+        match = _PATH_TOKEN.match(path, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid result path: {expression}")
+        key, index = match.groups()
+        if key is not None:
+            tokens.append(key)
+        else:
+            tokens.append("*" if index == "*" else int(index))
+        position = match.end()
+    if not tokens:
+        raise ValueError(f"Invalid result path: {expression}")
+    return tuple(tokens)
+
+
+def compile_result_paths(expressions: Optional[Iterable[str]]) -> Tuple[ResultPath, ...]:
+    """Parse a tool's projection paths once, dropping (and reporting) invalid ones"""
+    paths = []
+    for expression in expressions or ():
+        try:
+            paths.append((expression, parse_result_path(expression)))
+        except (ValueError, AttributeError):
+            print(f"Ignoring invalid tool result path: {expression!r}")
+    return tuple(paths)
+
+
+def _select(value: Any, tokens: Sequence[PathToken]) -> Any:
+    if not tokens:
+        return value
+    token, rest = tokens[0], tokens[1:]
+    if token == "*":
+        if isinstance(value, list):
+            items = (_select(item, rest) for item in value)
+        elif isinstance(value, dict):
+            items = (_select(item, rest) for item in value.values())
+        else:
+            return _MISSING
+        return [item for item in items if item is not _MISSING]
+    if isinstance(token, int):
+        if isinstance(value, list) and -len(value) <= token < len(value):
+            return _select(value[token], rest)
+        return _MISSING
+    if isinstance(value, dict) and token in value:
+        return _select(value[token], rest)
+    return _MISSING
+
+
+def project(value: Any, paths: Sequence[ResultPath]) -> Any:
+    """Keep only the fields named by `paths`, as a mapping of path expression to value"""
+    projected = {}
+    for expression, tokens in paths:
+        selected = _select(value, tokens)
+        if selected is not _MISSING:
+            projected[expression] = selected
+    return projected
+
+
+def _compact(value: Any, max_items: int, max_chars: int) -> Any:
+    if isinstance(value, str):
+        if len(value) > max_chars:
+            return value[:max_chars] + f"... [{len(value) - max_chars} more characters]"
+        return value
+    if isinstance(value, list):
+        items = [_compact(item, max_items, max_chars) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"... [{len(value) - max_items} more items]")
+        return items
+    if isinstance(value, dict):
+        keys = list(value)
+        compacted = {key: _compact(value[key], max_items, max_chars) for key in keys[:max_items * 4]}
+        if len(keys) > max_items * 4:
+            compacted["..."] = f"[{len(keys) - max_items * 4} more fields]"
+        return compacted
+    return value
+
+
+def _fits(text: str, max_tokens: int) -> bool:
+    # A token spans at least one and rarely more than eight characters,
+    # so only text in between needs counting
+    if len(text) <= max_tokens:
+        return True
+    if len(text) > max_tokens * 8:
+        return False
+    return count_tokens(text) <= max_tokens
+
+
+def shape_tool_result(result: Any, paths: Sequence[ResultPath], max_tokens: int) -> Any:
+    """
+    Reduce a tool result to what the model should see.
+
+    Projects `paths` when given, then, if the result is still over
+    `max_tokens`, shortens lists and strings step by step until it fits,
+    falling back to a plain-text preview. Shortened results are wrapped as
+    `{"truncated": true, "note": ..., "result"|"preview": ...}`.
+    """
+    if paths:
+        result = project(result, paths)
+    text = json.dumps(result)
+    if _fits(text, max_tokens):
+        return result
+
+    note = f"Result shortened to fit {max_tokens} tokens"
+    for max_items, max_chars in _COMPACTION_STEPS:
+        compacted = _compact(result, max_items, max_chars)
+        if _fits(json.dumps(compacted), max_tokens):
+            return {"truncated": True, "note": note, "result": compacted}
+    # Roughly four characters per token
+    return {"truncated": True, "note": note, "preview": text[:max_tokens * 4]}
@@ -1,4 +1,28 @@
-import requests
+import asyncio
+import json
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from app.config import settings
+from app.utils.circuit_breaker import tool_breakers
+from app.utils.tool_http import tool_http_pool
+
+# Path, relative to a tool's base URL, of the batch endpoint of batch-capable services
+BATCH_ENDPOINT = "Batch"
+
+
+class ToolCallError(Exception):
+    """
+    Raised when an external tool call fails.
+
+    `endpoint_failure` is False when the service answered with a client
+    error (bad arguments), which says nothing about the endpoint's health.
+    """
+
+    def __init__(self, message: str, *, endpoint_failure: bool = True):
+        super().__init__(message)
+        self.endpoint_failure = endpoint_failure
 
 
 def snake_to_pascal_case(snake_str):
@@ -8,8 +32,96 @@ def snake_to_pascal_case(snake_str):
     return ''.join(word.capitalize() for word in components)
 
 
-def call_external_tool(base_url: str, tool_name: str, tool_args: dict, secret_code: str | None = None):
-    """Call external tool service via HTTP request"""
+async def _post_to_tool_service(
+    base_url: str,
+    url: str,
+    payload: Any,
+    label: str,
+    secret_code: str | None,
+    timeout: float | None,
+) -> Any:
+    """
+    POST a JSON payload to a tool service and return the decoded JSON answer.
+
+    Guards the call with the base URL's circuit breaker and maps transport and
+    HTTP errors to ToolCallError; `label` names the call in error messages.
+    """
+    deadline_bound = timeout is not None and timeout < settings.TOOL_HTTP_READ_TIMEOUT
+    if timeout is not None and timeout <= 0:
+        raise ToolCallError(f"No time left to call external tool {label}", endpoint_failure=False)
+
+    # Fail fast while the endpoint's circuit breaker is open
+    if not tool_breakers.allow(base_url):
+        raise ToolCallError(f"Tool service for {label} at {base_url} is temporarily unavailable")
+
+    try:
+        # Prepare headers, optionally include Authorization Bearer
+        headers = {}
+        if secret_code:
+            headers["Authorization"] = f"Bearer {secret_code}"
+
+        max_bytes = settings.TOOL_RESPONSE_MAX_BYTES
+        response, body, truncated = await tool_http_pool.post(
+            url, json=payload, headers=headers, timeout=timeout, max_bytes=max_bytes
+        )
+        response.raise_for_status()
+
+        if truncated:
+            # Too large to parse; hand the model what was read, result shaping trims it further
+            result = {
+                "truncated": True,
+                "note": f"Response exceeded {max_bytes} bytes",
+                "preview": body.decode("utf-8", errors="ignore"),
+            }
+        else:
+            # Return the JSON response
+            result = json.loads(body)
+    except httpx.HTTPStatusError as e:
+        endpoint_failure = e.response.status_code >= 500
+        if endpoint_failure:
+            tool_breakers.record_failure(base_url, str(e))
+        else:
+            tool_breakers.record_success(base_url)
+        raise ToolCallError(f"Failed to call external tool {label} at {url}: {str(e)}", endpoint_failure=endpoint_failure)
+    except httpx.PoolTimeout:
+        # Every pooled connection to the service is busy; the service itself may be fine
+        tool_breakers.release(base_url)
+        raise ToolCallError(f"Too many concurrent calls to external tool {label} at {url}", endpoint_failure=False)
+    except httpx.TimeoutException as e:
+        if deadline_bound:
+            # Cut short by the caller's deadline, not a sign the endpoint is down
+            tool_breakers.release(base_url)
+            raise ToolCallError(f"External tool {label} at {url} did not answer in time", endpoint_failure=False)
+        tool_breakers.record_failure(base_url, str(e))
+        raise ToolCallError(f"External tool {label} at {url} timed out: {str(e)}")
+    except httpx.HTTPError as e:
+        tool_breakers.record_failure(base_url, str(e))
+        raise ToolCallError(f"Failed to call external tool {label} at {url}: {str(e)}")
+    except ValueError as e:
+        # The service answered, but not with JSON
+        tool_breakers.record_success(base_url)
+        raise ToolCallError(f"Invalid JSON from external tool {label} at {url}: {str(e)}", endpoint_failure=False)
+    except asyncio.CancelledError:
+        tool_breakers.release(base_url)
+        raise
+    except Exception as e:
+        # Anything else (e.g. httpx.InvalidURL) still settles the breaker, so a
+        # half-open trial is never left in flight
+        tool_breakers.record_failure(base_url, str(e))
+        raise ToolCallError(f"Failed to call external tool {label} at {url}: {str(e)}")
+
+    tool_breakers.record_success(base_url)
+    return result
+
+
+async def call_external_tool(
+    base_url: str,
+    tool_name: str,
+    tool_args: dict,
+    secret_code: str | None = None,
+    timeout: float | None = None,
+):
+    """Call external tool service over a pooled keep-alive connection, giving up after `timeout` seconds"""
     if not base_url:
         raise ValueError("Base URL is not configured for this tool")
     
@@ -23,18 +135,41 @@ def call_external_tool(base_url: str, tool_name: str, tool_args: dict, secret_co
     url = f"{base_url}/{endpoint_name}"
 
     print(f"Calling external tool {url} with arguments {tool_args}")
-    
-    try:
-        # Prepare headers, optionally include Authorization Bearer
-        headers = {}
-        if secret_code:
-            headers["Authorization"] = f"Bearer {secret_code}"
-        
-        # Make POST request with tool arguments
-        response = requests.post(url, json=tool_args, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Return the JSON response
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Failed to call external tool {tool_name} at {url}: {str(e)}")
+    return await _post_to_tool_service(base_url, url, tool_args, tool_name, secret_code, timeout)
+
+
+async def call_external_tool_batch(
+    base_url: str,
+    calls: List[Tuple[str, str, dict]],
+    secret_code: str | None = None,
+    timeout: float | None = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Send several `(tool_call_id, tool_name, tool_args)` calls to one service in a single request.
+
+    POSTs `{"calls": [{"id", "name", "arguments"}]}` to `{base_url}/Batch` and
+    expects a list of `{"id", "result"}` or `{"id", "error"}` items back, bare
+    or under `"results"`. Returns the items keyed by id.
+    """
+    if not base_url:
+        raise ValueError("Base URL is not configured for this tool")
+
+    base_url = base_url.rstrip('/')
+    url = f"{base_url}/{BATCH_ENDPOINT}"
+    payload = {
+        "calls": [
+            {"id": tool_call_id, "name": snake_to_pascal_case(tool_name), "arguments": tool_args}
+            for tool_call_id, tool_name, tool_args in calls
+        ]
+    }
+    label = f"batch of {len(calls)} calls"
+
+    print(f"Calling external tool batch {url} with {len(calls)} calls")
+    response = await _post_to_tool_service(base_url, url, payload, label, secret_code, timeout)
+
+    if isinstance(response, dict) and response.get("truncated") and "results" not in response:
+        raise ToolCallError(f"Answer from external tool {label} at {url} is too large: {response['note']}", endpoint_failure=False)
+    items = response.get("results") if isinstance(response, dict) else response
+    if not isinstance(items, list):
+        raise ToolCallError(f"Malformed answer from external tool {label} at {url}", endpoint_failure=False)
+    return {item["id"]: item for item in items if isinstance(item, dict) and "id" in item}
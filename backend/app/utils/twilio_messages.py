@@ -0,0 +1,98 @@
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+from app.utils.rate_limiter import retry_after_seconds
+
+# Twilio rejects message bodies longer than this
+MAX_BODY_CHARS = 1600
+
+
+class TwilioSendError(Exception):
+    """Raised when the Twilio Messages API does not accept a message"""
+
+    def __init__(self, message: str, *, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after  # Set from Retry-After when Twilio answered 429
+
+    @property
+    def retryable(self) -> bool:
+        """Network errors, 429 and 5xx may succeed later; other 4xx will not"""
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+
+def split_body(body: str, limit: int = MAX_BODY_CHARS) -> List[str]:
+    """Split a reply into Twilio-sized parts, preferring line and word breaks"""
+    parts = []
+    while len(body) > limit:
+        # Break at a newline or space unless that would leave a short part
+        cut = body.rfind("\n", limit // 2, limit)
+        if cut < 0:
+            cut = body.rfind(" ", limit // 2, limit)
+        if cut < 0:
+            cut = limit
+        parts.append(body[:cut].rstrip())
+        body = body[cut:].lstrip()
+    if body:
+        parts.append(body)
+    return parts
+
+
+class TwilioMessagesClient:
+    """
+    Sends messages through the Twilio Messages REST API over one keep-alive client.
+
+    `base_url` defaults to TWILIO_API_BASE_URL so local runs can point it at
+    a stub instead of api.twilio.com.
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self.sent = 0
+        self.errors = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def send(self, *, account_sid: str, auth_token: str, from_number: str, to_number: str, body: str) -> Dict[str, Any]:
+        """Create one message; returns Twilio's message resource"""
+        url = f"{self.base_url}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        try:
+            response = await self._get_client().post(
+                url,
+                data={"From": from_number, "To": to_number, "Body": body},
+                auth=(account_sid, auth_token),
+            )
+        except httpx.HTTPError as e:
+            self.errors += 1
+            raise TwilioSendError(f"Failed to reach Twilio: {str(e)}")
+        if response.status_code >= 400:
+            self.errors += 1
+            raise TwilioSendError(
+                f"Twilio rejected message to {to_number}: {response.status_code} {response.text}",
+                status_code=response.status_code,
+                retry_after=retry_after_seconds(response.headers) if response.status_code == 429 else None,
+            )
+        self.sent += 1
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"base_url": self.base_url, "sent": self.sent, "errors": self.errors}
+
+    async def aclose(self) -> None:
+        """Close the HTTP client; used on application shutdown"""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+twilio_messages = TwilioMessagesClient(settings.TWILIO_API_BASE_URL, settings.TWILIO_API_TIMEOUT)
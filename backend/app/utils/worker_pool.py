@@ -0,0 +1,97 @@
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+
+Job = Callable[[], Awaitable[None]]
+
+
+class WorkerPool:
+    """
+    Fixed set of asyncio workers draining a bounded queue of jobs.
+
+    Lets request handlers hand off slow work (a chat turn, an outbound
+    message) and answer right away. `submit` never waits: it returns False
+    when the queue is full so the caller can push back.
+    """
+
+    def __init__(self, name: str, *, workers: int, queue_size: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._queue: Optional["asyncio.Queue[Job]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        """Start the workers on the running event loop; called at startup or on first submit"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def submit(self, job: Job) -> bool:
+        """Queue `job` for a worker; returns False if the queue is full"""
+        self.start()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        return True
+
+    @property
+    def saturated(self) -> bool:
+        """True while the queue is full and `submit` would be rejected"""
+        return self._queue is not None and self._queue.full()
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.busy += 1
+            try:
+                await job()
+                self.processed += 1
+            except Exception:
+                self.failed += 1
+                print(f"{self.name} job failed")
+                traceback.print_exc()
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Give queued jobs up to `timeout` seconds to finish, then cancel the workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"{self.name}: dropping {self._queue.qsize()} queued job(s) on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers if self._tasks else 0,
+            "busy": self.busy,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+whatsapp_worker_pool = WorkerPool(
+    "whatsapp",
+    workers=settings.WHATSAPP_WORKERS,
+    queue_size=settings.WHATSAPP_QUEUE_SIZE,
+)
@@ -0,0 +1,166 @@
+"""
+OpenAI-compatible mock chat completions server for offline benchmarks.
+
+Answers `POST /v1/chat/completions`, streaming or not, after a configurable
+delay. When the request offers tools, a tool-call script decides which
+calls the "model" makes: round N of the script is played when N assistant
+tool-call messages already follow the last user message, and the final
+text reply comes once the script is exhausted.
+
+Run standalone with `python -m benchmarks.mock_llm --port 9100` and point
+the API at it with `OPENAI_BASE_URL=http://127.0.0.1:9100/v1`.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class MockLLMConfig:
+    latency: float = 0.2  # Seconds before the first byte of an answer
+    token_delay: float = 0.005  # Seconds between streamed tokens
+    reply_tokens: int = 40  # Words in the final text reply
+    # Rounds of tool calls, each a list of {"name": ..., "arguments": {...}};
+    # calls to tools the request does not offer are skipped
+    tool_script: List[List[Dict[str, Any]]] = field(default_factory=list)
+
+
+def _prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    # Same rough four-characters-per-token estimate the API falls back to
+    return sum(len(json.dumps(message)) for message in messages) // 4 + 1
+
+
+def _script_round(config: MockLLMConfig, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The tool calls the script makes for this request, empty for a text reply"""
+    offered = {tool["function"]["name"] for tool in body.get("tools") or () if tool.get("type") == "function"}
+    if not offered or body.get("tool_choice") == "none":
+        return []
+    messages = body.get("messages", [])
+    rounds = 0
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            break
+        if message.get("role") == "assistant" and message.get("tool_calls"):
+            rounds += 1
+    if rounds >= len(config.tool_script):
+        return []
+    return [
+        {
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))},
+        }
+        for call in config.tool_script[rounds]
+        if call["name"] in offered
+    ]
+
+
+def _reply_words(config: MockLLMConfig, body: Dict[str, Any]) -> List[str]:
+    words = [f"word{i}" for i in range(config.reply_tokens)]
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        # json_object mode must still produce valid JSON once the pieces are joined
+        return ['{"reply": "'] + [f"{word} " for word in words] + ['"}']
+    return [f"{word} " for word in words]
+
+
+def create_app(config: Optional[MockLLMConfig] = None) -> FastAPI:
+    config = config or MockLLMConfig()
+    app = FastAPI(title="Mock OpenAI")
+    app.state.config = config
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+        created = int(time.time())
+        model = body.get("model", "mock")
+        tool_calls = _script_round(config, body)
+        words = [] if tool_calls else _reply_words(config, body)
+        usage = {
+            "prompt_tokens": _prompt_tokens(body.get("messages", [])),
+            "completion_tokens": len(words) + 10 * len(tool_calls),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        await asyncio.sleep(config.latency)
+
+        if not body.get("stream"):
+            message: Dict[str, Any] = {"role": "assistant", "content": "".join(words) or None}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                }],
+                "usage": usage,
+            })
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for index, call in enumerate(tool_calls):
+                yield chunk({"tool_calls": [{"index": index, **call}]})
+            for word in words:
+                await asyncio.sleep(config.token_delay)
+                yield chunk({"content": word})
+            yield chunk({}, "tool_calls" if tool_calls else "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=MockLLMConfig.latency)
+    parser.add_argument("--token-delay", type=float, default=MockLLMConfig.token_delay)
+    parser.add_argument("--reply-tokens", type=int, default=MockLLMConfig.reply_tokens)
+    parser.add_argument("--tool-script", help="JSON list of tool-call rounds, or @path to a JSON file")
+    args = parser.parse_args()
+
+    script = []
+    if args.tool_script:
+        text = open(args.tool_script[1:]).read() if args.tool_script.startswith("@") else args.tool_script
+        script = json.loads(text)
+    uvicorn.run(
+        create_app(MockLLMConfig(args.latency, args.token_delay, args.reply_tokens, script)),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
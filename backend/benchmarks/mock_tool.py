@@ -0,0 +1,79 @@
+"""
+Mock tool service for offline benchmarks.
+
+Answers `POST /{PascalCaseName}` and the `POST /Batch` protocol after a
+configurable delay, echoing the arguments back with optional padding to
+exercise result shaping.
+
+Run standalone with `python -m benchmarks.mock_tool --port 9200`.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class MockToolConfig:
+    latency: float = 0.05  # Seconds before each answer
+    result_bytes: int = 0  # Padding added to each result
+
+
+def create_app(config: Optional[MockToolConfig] = None) -> FastAPI:
+    config = config or MockToolConfig()
+    app = FastAPI(title="Mock tool service")
+    app.state.config = config
+    app.state.requests = 0
+    app.state.calls = 0
+
+    def result(name: str, arguments: Any) -> Dict[str, Any]:
+        answer = {"tool": name, "arguments": arguments, "ok": True}
+        if config.result_bytes:
+            answer["padding"] = "x" * config.result_bytes
+        return answer
+
+    @app.post("/Batch")
+    async def batch(request: Request):
+        body = await request.json()
+        calls = body.get("calls", [])
+        app.state.requests += 1
+        app.state.calls += len(calls)
+        await asyncio.sleep(config.latency)
+        return JSONResponse({
+            "results": [{"id": call["id"], "result": result(call["name"], call.get("arguments"))} for call in calls]
+        })
+
+    @app.post("/{name}")
+    async def call(name: str, request: Request):
+        arguments = await request.json()
+        app.state.requests += 1
+        app.state.calls += 1
+        await asyncio.sleep(config.latency)
+        return JSONResponse(result(name, arguments))
+
+    @app.get("/stats")
+    def stats():
+        return {"requests": app.state.requests, "calls": app.state.calls}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock tool service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency", type=float, default=MockToolConfig.latency)
+    parser.add_argument("--result-bytes", type=int, default=MockToolConfig.result_bytes)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(MockToolConfig(args.latency, args.result_bytes)),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
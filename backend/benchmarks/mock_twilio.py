@@ -0,0 +1,84 @@
+"""
+Mock Twilio Messages API for offline benchmarks and local development.
+
+Accepts `POST /2010-04-01/Accounts/{AccountSid}/Messages.json` like Twilio
+does and answers with a queued message resource, without sending anything.
+
+Run standalone with `python -m benchmarks.mock_twilio --port 9300` and point
+the API at it with `TWILIO_API_BASE_URL=http://127.0.0.1:9300`. Use
+`--failure-rate 0.2 --failure-status 429` to exercise outbound retries and
+dead-lettering.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class MockTwilioConfig:
+    latency: float = 0.05  # Seconds before each answer
+    failure_rate: float = 0.0  # Share of requests answered with failure_status
+    failure_status: int = 429
+
+
+def create_app(config: Optional[MockTwilioConfig] = None) -> FastAPI:
+    config = config or MockTwilioConfig()
+    app = FastAPI(title="Mock Twilio")
+    app.state.config = config
+    app.state.messages = 0
+    app.state.failures = 0
+    app.state.last_message_at = None
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def create_message(account_sid: str, request: Request):
+        form = await request.form()
+        await asyncio.sleep(config.latency)
+        if config.failure_rate and random.random() < config.failure_rate:
+            app.state.failures += 1
+            return JSONResponse(
+                {"code": 20429 if config.failure_status == 429 else 20500, "message": "Mock failure", "status": config.failure_status},
+                status_code=config.failure_status,
+                headers={"Retry-After": "1"} if config.failure_status == 429 else None,
+            )
+        app.state.messages += 1
+        app.state.last_message_at = time.time()
+        return JSONResponse({
+            "sid": f"SM{uuid.uuid4().hex}",
+            "account_sid": account_sid,
+            "from": form.get("From"),
+            "to": form.get("To"),
+            "body": form.get("Body"),
+            "status": "queued",
+        }, status_code=201)
+
+    @app.get("/stats")
+    def stats():
+        return {
+            "messages": app.state.messages,
+            "failures": app.state.failures,
+            "last_message_at": app.state.last_message_at,
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock Twilio Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9300)
+    parser.add_argument("--latency", type=float, default=MockTwilioConfig.latency)
+    parser.add_argument("--failure-rate", type=float, default=MockTwilioConfig.failure_rate)
+    parser.add_argument("--failure-status", type=int, default=MockTwilioConfig.failure_status)
+    args = parser.parse_args()
+
+    config = MockTwilioConfig(args.latency, args.failure_rate, args.failure_status)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,445 @@
+"""
+Offline benchmark suite for the Synapse API.
+
+Starts a mock OpenAI server, a mock tool service and a mock Twilio Messages
+API on localhost, creates a
+throwaway user, API key, agents, tool and WhatsApp integration through the
+API, then drives each scenario at a fixed concurrency and reports
+throughput and p50/p95/p99 latency. No network access is needed.
+
+    # Against an API already started with OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    # and TWILIO_API_BASE_URL=http://127.0.0.1:9300
+    python -m benchmarks.run --api-url http://127.0.0.1:8000
+
+    # Or let the suite start the API itself (uses DATABASE_URL from the environment)
+    python -m benchmarks.run --serve --output before.json
+    python -m benchmarks.run --serve --compare before.json
+
+Scenarios: crud, chat, chat-tools, chat-stream, twilio.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+from benchmarks import mock_llm, mock_tool, mock_twilio
+
+SCENARIOS = ("crud", "chat", "chat-tools", "chat-stream", "twilio")
+
+BENCH_TOOL_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": "bench_lookup",
+        "description": "Look up a record for the benchmark",
+        "parameters": {
+            "type": "object",
+            "properties": {"query": {"type": "string"}},
+            "required": ["query"],
+        },
+    },
+}
+
+
+class ServerThread:
+    """Run an ASGI app with uvicorn on a background thread"""
+
+    def __init__(self, app: Any, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "ServerThread":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Mock server on port {self.port} did not start")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def twilio_signature(url: str, params: Dict[str, str], auth_token: str) -> str:
+    """X-Twilio-Signature for a form POST, as Twilio computes it"""
+    payload = url + "".join(f"{key}{value}" for key, value in sorted(params.items()))
+    digest = hmac.new(auth_token.encode(), payload.encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(1, min(len(samples), math.ceil(p / 100 * len(samples))))
+    return samples[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round((len(latencies) + errors) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+class BenchContext:
+    """Resources created for the run, plus the authenticated client"""
+
+    def __init__(self, client: httpx.AsyncClient, public_base_url: str):
+        self.client = client
+        self.public_base_url = public_base_url.rstrip("/")
+        self.user_id = ""
+        self.api_key_id = ""
+        self.agent_id = ""
+        self.tools_agent_id = ""
+        self.tool_id = ""
+        self.integration: Dict[str, Any] = {}
+
+    async def call(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        response = await self.client.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def setup(self, tool_url: str) -> None:
+        suffix = uuid.uuid4().hex[:8]
+        email = f"bench-{suffix}@example.com"
+        password = f"bench-{suffix}"
+        user = (await self.call("POST", "/api/v1/auth/register", json={"name": "Benchmark", "email": email, "password": password})).json()
+        self.user_id = user["id"]
+        token = (await self.call("POST", "/api/v1/auth/login", json={"email": email, "password": password})).json()
+        self.client.headers["Authorization"] = f"Bearer {token['access_token']}"
+
+        api_key = (await self.call("POST", "/api/v1/api-keys/", json={"name": "bench", "key": "sk-bench", "provider": "openai"})).json()
+        self.api_key_id = api_key["id"]
+        agent = {"model": "gpt-4o-mini", "maxTokens": 256, "apiKeyId": self.api_key_id}
+        self.agent_id = (await self.call("POST", "/api/v1/agents/", json={"name": "bench-chat", **agent})).json()["id"]
+        self.tools_agent_id = (await self.call("POST", "/api/v1/agents/", json={"name": "bench-tools", **agent})).json()["id"]
+        tool = {
+            "name": "bench-tool",
+            "type": "function",
+            "baseUrl": tool_url,
+            "functionSchema": {"tools": [BENCH_TOOL_SCHEMA]},
+            "functionNames": ["bench_lookup"],
+        }
+        self.tool_id = (await self.call("POST", "/api/v1/tools/", json=tool)).json()["id"]
+        await self.call("POST", f"/api/v1/agents/{self.tools_agent_id}/tools/{self.tool_id}")
+        self.integration = (await self.call("POST", "/api/v1/integrations/whatsapp", json={
+            "agent_id": self.agent_id,
+            "twilio_auth_token": f"bench-token-{suffix}",
+            "twilio_account_sid": f"ACbench{suffix}",
+            "twilio_phone_number": "whatsapp:+15550000000",
+        })).json()
+
+    async def teardown(self) -> None:
+        cleanup = []
+        if self.integration:
+            cleanup.append(f"/api/v1/integrations/whatsapp/{self.integration['id']}")
+        cleanup += [f"/api/v1/agents/{agent_id}" for agent_id in (self.agent_id, self.tools_agent_id) if agent_id]
+        if self.tool_id:
+            cleanup.append(f"/api/v1/tools/{self.tool_id}")
+        if self.api_key_id:
+            cleanup.append(f"/api/v1/api-keys/{self.api_key_id}")
+        for url in cleanup:
+            try:
+                await self.client.delete(url)
+            except httpx.HTTPError as e:
+                print(f"Cleanup of {url} failed: {e}")
+
+
+# Each operation performs one logical request and returns the label it is reported under
+
+async def crud_operation(ctx: BenchContext, index: int) -> str:
+    step = index % 5
+    if step == 0:
+        await ctx.call("GET", "/api/v1/agents/")
+        return "crud:list-agents"
+    if step == 1:
+        await ctx.call("GET", f"/api/v1/agents/{ctx.agent_id}")
+        return "crud:get-agent"
+    if step == 2:
+        await ctx.call("GET", "/api/v1/tools/")
+        return "crud:list-tools"
+    if step == 3:
+        await ctx.call("PUT", f"/api/v1/agents/{ctx.agent_id}", json={"description": f"bench {index}"})
+        return "crud:update-agent"
+    agent = (await ctx.call("POST", "/api/v1/agents/", json={"name": f"bench-tmp-{index}", "apiKeyId": ctx.api_key_id})).json()
+    await ctx.call("DELETE", f"/api/v1/agents/{agent['id']}")
+    return "crud:create-delete-agent"
+
+
+async def chat_operation(ctx: BenchContext, index: int) -> str:
+    # Distinct messages so requests are not coalesced into one turn
+    await ctx.call("POST", "/api/v1/chat/", json={
+        "agent_id": ctx.agent_id, "user_id": ctx.user_id, "message_content": f"bench message {index}",
+    })
+    return "chat"
+
+
+async def chat_tools_operation(ctx: BenchContext, index: int) -> str:
+    await ctx.call("POST", "/api/v1/chat/", json={
+        "agent_id": ctx.tools_agent_id, "user_id": ctx.user_id, "message_content": f"bench lookup {index}",
+    })
+    return "chat-tools"
+
+
+async def chat_stream_operation(ctx: BenchContext, index: int) -> str:
+    body = {"agent_id": ctx.agent_id, "user_id": ctx.user_id, "message_content": f"bench stream {index}"}
+    async with ctx.client.stream("POST", "/api/v1/chat/stream", json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: error"):
+                raise RuntimeError("stream ended with an error event")
+    return "chat-stream"
+
+
+async def twilio_operation(ctx: BenchContext, index: int) -> str:
+    path = f"/api/v1/integrations/connectors/whatsapp/twilio/{ctx.integration['path_token']}"
+    params = {
+        "MessageSid": f"SMbench{uuid.uuid4().hex}",
+        "AccountSid": ctx.integration["twilio_account_sid"],
+        # One sender per message so debouncing never merges two into one reply
+        "From": f"whatsapp:+1555{index:07d}",
+        "To": ctx.integration["twilio_phone_number"],
+        "Body": f"bench whatsapp {index}",
+        "NumMedia": "0",
+    }
+    signature = twilio_signature(ctx.public_base_url + path, params, ctx.integration["twilio_auth_token"])
+    await ctx.call("POST", path, data=params, headers={"X-Twilio-Signature": signature})
+    return "twilio"
+
+
+OPERATIONS: Dict[str, Callable[[BenchContext, int], Awaitable[str]]] = {
+    "crud": crud_operation,
+    "chat": chat_operation,
+    "chat-tools": chat_tools_operation,
+    "chat-stream": chat_stream_operation,
+    "twilio": twilio_operation,
+}
+
+
+async def run_scenario(ctx: BenchContext, name: str, *, requests: int, concurrency: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    """Run `requests` operations with `concurrency` workers; returns stats per label"""
+    operation = OPERATIONS[name]
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    counter = iter(range(warmup + requests))
+
+    async def worker():
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                label = await operation(ctx, index)
+            except Exception as e:
+                if index >= warmup:
+                    errors[name] = errors.get(name, 0) + 1
+                    if errors[name] <= 3:
+                        print(f"  {name} request {index} failed: {e!r}")
+                continue
+            if index >= warmup:
+                latencies.setdefault(label, []).append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    labels = set(latencies) | set(errors)
+    return {label: summarize(latencies.get(label, []), errors.get(label, 0), elapsed) for label in sorted(labels)}
+
+
+def print_report(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    columns = ("requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'operation':<28}" + "".join(f"{column:>16}" for column in columns))
+    for label, stats in results.items():
+        row = f"{label:<28}"
+        for column in columns:
+            cell = f"{stats.get(column, '-')}"
+            previous = (baseline or {}).get(label, {}).get(column)
+            if previous and column in stats and column not in ("requests", "errors"):
+                cell += f" ({(stats[column] - previous) / previous * 100:+.0f}%)"
+            row += f"{cell:>16}"
+        print(row)
+
+
+def start_api(port: int, llm_url: str, twilio_url: str) -> subprocess.Popen:
+    """Start the API with uvicorn, pointed at the mock OpenAI and Twilio servers"""
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "TWILIO_API_BASE_URL": twilio_url,
+        "TWILIO_PUBLIC_BASE_URL": f"http://127.0.0.1:{port}",
+        "LLM_CLIENT_PREWARM_KEYS": "0",
+    }
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir,
+        env=env,
+    )
+
+
+async def wait_for_api(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("API did not become healthy")
+        await asyncio.sleep(0.25)
+
+
+async def wait_for_replies(twilio_app: Any, already_sent: int, expected: int, started: float, timeout: float) -> Dict[str, Any]:
+    """Wait for the webhook replies to reach the mock Twilio API; reports how fast they drained"""
+    deadline = time.monotonic() + timeout
+    while twilio_app.state.messages - already_sent < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    delivered = twilio_app.state.messages - already_sent
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": delivered,
+        "errors": max(0, expected - delivered),
+        "throughput_rps": round(delivered / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    script = [[{"name": "bench_lookup", "arguments": {"query": "bench"}}]] * args.tool_rounds
+    llm = ServerThread(mock_llm.create_app(mock_llm.MockLLMConfig(
+        latency=args.llm_latency,
+        token_delay=args.token_delay,
+        reply_tokens=args.reply_tokens,
+        tool_script=script,
+    )), args.llm_port).start()
+    tools = ServerThread(mock_tool.create_app(mock_tool.MockToolConfig(
+        latency=args.tool_latency,
+        result_bytes=args.tool_result_bytes,
+    )), args.tool_port).start()
+    twilio_app = mock_twilio.create_app(mock_twilio.MockTwilioConfig(
+        latency=args.twilio_latency, failure_rate=args.twilio_failure_rate
+    ))
+    twilio = ServerThread(twilio_app, args.twilio_port).start()
+
+    api = None
+    api_url = args.api_url
+    if args.serve:
+        api = start_api(args.api_port, llm.url, twilio.url)
+        api_url = f"http://127.0.0.1:{args.api_port}"
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        async with httpx.AsyncClient(base_url=api_url, timeout=args.timeout, limits=limits) as client:
+            await wait_for_api(client)
+            ctx = BenchContext(client, args.public_base_url or api_url)
+            await ctx.setup(tools.url)
+            try:
+                for name in args.scenarios:
+                    print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}")
+                    started = time.perf_counter()
+                    replies_before = twilio_app.state.messages
+                    results.update(await run_scenario(
+                        ctx, name, requests=args.requests, concurrency=args.concurrency, warmup=args.warmup,
+                    ))
+                    if name == "twilio":
+                        # The webhook only acknowledges; replies are sent in the background
+                        results["twilio:replies"] = await wait_for_replies(
+                            twilio_app, replies_before, args.warmup + args.requests, started, args.timeout,
+                        )
+            finally:
+                await ctx.teardown()
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait(timeout=10)
+        llm.stop()
+        tools.stop()
+        twilio.stop()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+            "token_delay": args.token_delay,
+            "reply_tokens": args.reply_tokens,
+            "tool_latency": args.tool_latency,
+            "tool_rounds": args.tool_rounds,
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the Synapse API")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000", help="API to benchmark when not using --serve")
+    parser.add_argument("--serve", action="store_true", help="Start the API with uvicorn against the mock servers")
+    parser.add_argument("--api-port", type=int, default=8800, help="Port for the API started by --serve")
+    parser.add_argument("--public-base-url", help="TWILIO_PUBLIC_BASE_URL of the API, for webhook signatures (default: API URL)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--tool-port", type=int, default=9200)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    parser.add_argument("--tool-result-bytes", type=int, default=0)
+    parser.add_argument("--twilio-port", type=int, default=9300)
+    parser.add_argument("--twilio-latency", type=float, default=0.05)
+    parser.add_argument("--twilio-failure-rate", type=float, default=0.0, help="Share of sends the mock Twilio answers with 429")
+    parser.add_argument("--tool-rounds", type=int, default=1, help="Tool-call rounds per chat-tools turn")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous --output file to compare against")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print()
+    print_report(report["results"], baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")